@@ -0,0 +1,129 @@
+import threading
+
+import numpy as np
+
+from similarity import cosine_similarities, select_top_k
+
+# Approximate nearest-neighbour index for cosine similarity. Kept free of
+# database and model side effects like similarity.py.
+
+class RandomProjectionLSH:
+    """Random-hyperplane LSH over L2-normalized vectors, grouped by location
+
+    Every table hashes a vector to the sign pattern of n_bits random
+    projections, so vectors with a small angle between them tend to share a
+    bucket. Buckets are keyed by (group, code), which keeps the strict location
+    filter of the exact path. Candidates from all tables are re-ranked exactly.
+
+    Recall goes up (and latency with it) with more tables, fewer bits, or
+    probe_radius=1, which also probes every bucket one bit flip away.
+    """
+
+    def __init__(self, dim, n_tables=8, n_bits=20, probe_radius=0, seed=0):
+        rng = np.random.default_rng(seed)
+        self.dim = dim
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.probe_radius = probe_radius
+        self.planes = rng.standard_normal((n_tables, n_bits, dim)).astype(np.float32)
+        self._weights = 1 << np.arange(n_bits, dtype=np.int64)
+        self._tables = [{} for _ in range(n_tables)]
+        # Vector storage; freed slots are reused by later inserts
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._values = np.zeros(0, dtype=np.int64)
+        self._slot_info = []
+        self._slots = {}
+        self._free = []
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _codes(self, vectors):
+        # (n_tables, n) bucket codes
+        projections = np.einsum('tbd,nd->tnb', self.planes, vectors)
+        return (projections > 0).astype(np.int64) @ self._weights
+
+    def _grow(self, needed):
+        capacity = len(self._vectors)
+        if capacity >= needed:
+            return
+        new_capacity = max(needed, capacity * 2, 64)
+        vectors = np.zeros((new_capacity, self.dim), dtype=np.float32)
+        vectors[:capacity] = self._vectors
+        values = np.zeros(new_capacity, dtype=np.int64)
+        values[:capacity] = self._values
+        self._vectors = vectors
+        self._values = values
+        self._slot_info.extend([None] * (new_capacity - capacity))
+        self._free.extend(range(new_capacity - 1, capacity - 1, -1))
+
+    def add(self, keys, values, groups, vectors):
+        """Insert or replace vectors; key identifies the row, value is what queries return"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(vectors) == 0:
+            return
+        codes = self._codes(vectors)
+
+        with self._lock:
+            self.remove([key for key in keys if key in self._slots])
+            self._grow(len(self._slots) + len(vectors))
+            for row, (key, value, group) in enumerate(zip(keys, values, groups)):
+                slot = self._free.pop()
+                self._vectors[slot] = vectors[row]
+                self._values[slot] = value
+                buckets = []
+                for table, bucket_codes in zip(self._tables, codes):
+                    bucket = (group, int(bucket_codes[row]))
+                    table.setdefault(bucket, set()).add(slot)
+                    buckets.append(bucket)
+                self._slot_info[slot] = (key, buckets)
+                self._slots[key] = slot
+
+    def remove(self, keys):
+        """Delete vectors by key; unknown keys are ignored"""
+        with self._lock:
+            for key in keys:
+                slot = self._slots.pop(key, None)
+                if slot is None:
+                    continue
+                _, buckets = self._slot_info[slot]
+                for table, bucket in zip(self._tables, buckets):
+                    members = table[bucket]
+                    members.discard(slot)
+                    if not members:
+                        del table[bucket]
+                self._slot_info[slot] = None
+                self._free.append(slot)
+
+    def _probe_codes(self, code):
+        yield code
+        if self.probe_radius >= 1:
+            for bit in range(self.n_bits):
+                yield code ^ (1 << bit)
+
+    def query(self, vector, group, top_n, exclude_value=None):
+        """Values of the approximately top_n most similar vectors in group"""
+        vector = np.asarray(vector, dtype=np.float32)
+        codes = self._codes(vector[np.newaxis, :])[:, 0]
+
+        with self._lock:
+            candidates = set()
+            for table, code in zip(self._tables, codes):
+                for probe in self._probe_codes(int(code)):
+                    members = table.get((group, probe))
+                    if members:
+                        candidates.update(members)
+            if not candidates:
+                return []
+
+            slots = np.fromiter(candidates, dtype=np.intp, count=len(candidates))
+            values = self._values[slots]
+            similarities = cosine_similarities(self._vectors[slots], vector)
+
+        if exclude_value is not None:
+            keep = values != exclude_value
+            values = values[keep]
+            similarities = similarities[keep]
+        order = select_top_k(similarities, values, top_n)
+        return values[order].tolist()
@@ -0,0 +1,84 @@
+import asyncio
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PREDICTION_BATCHING = os.getenv("PREDICTION_BATCHING", "true").lower() == "true"
+PREDICTION_MAX_BATCH_SIZE = int(os.getenv("PREDICTION_MAX_BATCH_SIZE", "64"))
+PREDICTION_MAX_WAIT_US = int(os.getenv("PREDICTION_MAX_WAIT_US", "1000"))
+
+class PredictionCoalescer:
+    """Gather concurrent single-row predictions into one batched model call
+
+    Rows submitted while a batch is open are stacked and scored together by
+    predict_batch off the event loop (through run), once max_batch_size rows
+    are waiting or max_wait_us has passed since the first one. Each caller gets
+    its own row's result back. All bookkeeping happens on the event loop, so
+    no locks are needed.
+    """
+
+    def __init__(self, predict_batch, max_batch_size=PREDICTION_MAX_BATCH_SIZE, max_wait_us=PREDICTION_MAX_WAIT_US,
+                 run=asyncio.to_thread):
+        self.predict_batch = predict_batch
+        # Coroutine function used to call predict_batch off the event loop
+        self.run = run
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_us / 1_000_000
+        self._pending = []
+        self._timer = None
+        self.batches = 0
+        self.rows = 0
+        self.largest_batch = 0
+
+    async def submit(self, row):
+        """Score one (1, n_features) row; resolves when its batch is done"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        # Callers may reuse their row buffer as soon as we return to the loop
+        self._pending.append((np.array(row[0], copy=True), future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.get_running_loop().create_task(self._run(batch))
+
+    async def _run(self, batch):
+        self.batches += 1
+        self.rows += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+
+        rows = np.stack([row for row, _ in batch])
+        try:
+            results = await self.run(self.predict_batch, rows)
+        except Exception as e:
+            logger.error(f"Batched prediction of {len(batch)} rows failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            # The awaiting request may have been cancelled meanwhile
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "rows": self.rows,
+            "largest_batch": self.largest_batch,
+            "mean_batch_size": self.rows / self.batches if self.batches else 0.0,
+        }
@@ -0,0 +1,74 @@
+"""Recall@k and latency of the LSH backend against exact cosine search
+
+Runs on a synthetic single-location catalog with the same six numeric
+features as the houses table:
+
+    python -m benchmarks.ann_recall --houses 200000 --queries 500
+"""
+import argparse
+import time
+
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+
+from ann import RandomProjectionLSH
+from similarity import rank_similar
+
+# (tables, bits, probe_radius) combinations to compare
+CONFIGS = [(4, 16, 0), (8, 16, 0), (8, 20, 0), (16, 20, 0), (8, 20, 1)]
+
+def synthetic_features(n, seed):
+    rng = np.random.default_rng(seed)
+    # price, room_count, bathroom_count, parking_count, land_area, building_area
+    land_area = rng.lognormal(5, 0.5, n)
+    building_area = land_area * rng.uniform(0.4, 1.2, n)
+    rooms = np.clip(np.round(building_area / 40 + rng.normal(0, 1, n)), 1, 10)
+    raw = np.column_stack([
+        building_area * rng.lognormal(16, 0.3, n) / 100,
+        rooms,
+        np.clip(np.round(rooms / 2 + rng.normal(0, 0.7, n)), 1, 6),
+        rng.integers(0, 4, n),
+        land_area,
+        building_area,
+    ])
+    scaled = StandardScaler().fit_transform(raw)
+    scaled /= np.linalg.norm(scaled, axis=1, keepdims=True)
+    return np.ascontiguousarray(scaled, dtype=np.float32)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--houses", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    features = synthetic_features(args.houses, args.seed)
+    indices = np.arange(args.houses, dtype=np.int64)
+    groups = ["bench"] * args.houses
+    queries = np.random.default_rng(args.seed + 1).choice(args.houses, args.queries, replace=False)
+
+    started = time.perf_counter()
+    exact = [rank_similar(features, indices, features @ features[q], features[q], int(q), args.top_k) for q in queries]
+    exact_ms = (time.perf_counter() - started) * 1000 / len(queries)
+    print(f"exact: {exact_ms:.3f} ms/query")
+
+    for n_tables, n_bits, probe_radius in CONFIGS:
+        index = RandomProjectionLSH(features.shape[1], n_tables, n_bits, probe_radius, seed=args.seed)
+        started = time.perf_counter()
+        index.add(indices.tolist(), indices.tolist(), groups, features)
+        build_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        approximate = [index.query(features[q], "bench", args.top_k, exclude_value=int(q)) for q in queries]
+        query_ms = (time.perf_counter() - started) * 1000 / len(queries)
+
+        hits = sum(len(set(a) & set(e)) for a, e in zip(approximate, exact))
+        recall = hits / sum(len(e) for e in exact)
+        print(
+            f"lsh tables={n_tables} bits={n_bits} probe_radius={probe_radius}: "
+            f"recall@{args.top_k}={recall:.3f} {query_ms:.3f} ms/query build={build_s:.1f}s"
+        )
+
+if __name__ == "__main__":
+    main()
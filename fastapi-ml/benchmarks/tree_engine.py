@@ -0,0 +1,65 @@
+"""Latency of the NumPy tree evaluator against XGBClassifier.predict by batch size
+
+Uses the current credit model (native artifacts, else the pickles) and random
+scaled rows, checks both engines agree, and prints the largest batch size at
+which the evaluator is faster, the value for NUMPY_ENGINE_MAX_BATCH_SIZE:
+
+    python -m benchmarks.tree_engine --max-batch 100000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from model_artifacts import load_credit_artifacts
+from tree_engine import TreeEnsemble, check_parity
+
+BATCH_SIZES = [1, 4, 16, 64, 256, 1024, 4096, 16384, 100000]
+
+def best_of(fn, X, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn(X)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--max-batch", type=int, default=100000)
+    parser.add_argument("--min-seconds", type=float, default=0.2, help="time spent per engine and batch size")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    model, _, _, version = load_credit_artifacts()
+    ensemble = TreeEnsemble.from_model(model)
+    check_parity(model, ensemble)
+    print(f"model {version}: {ensemble.n_trees} trees, depth {ensemble.max_depth}, {len(ensemble.value)} nodes")
+
+    rng = np.random.default_rng(args.seed)
+    crossover = 0
+    still_faster = True
+    print(f"{'batch':>8} {'xgboost ms':>11} {'numpy ms':>10} {'speedup':>8}")
+    for batch_size in [size for size in BATCH_SIZES if size <= args.max_batch]:
+        X = rng.normal(size=(batch_size, ensemble.n_features)).astype(np.float32)
+        expected_margins = np.asarray(model.predict(X, output_margin=True), dtype=np.float32).reshape(batch_size, -1)
+        if not np.array_equal(model.predict(X), ensemble.predict(X)) or not np.array_equal(expected_margins, ensemble.margins(X)):
+            raise SystemExit(f"Engines disagree at batch size {batch_size}")
+
+        # Enough repeats for min_seconds per engine, at least 3
+        single = time.perf_counter()
+        model.predict(X)
+        repeats = max(3, int(args.min_seconds / max(time.perf_counter() - single, 1e-6)))
+        xgboost_s = best_of(model.predict, X, repeats)
+        numpy_s = best_of(ensemble.predict, X, repeats)
+        # Largest size up to which the evaluator wins at every size
+        if numpy_s < xgboost_s and still_faster:
+            crossover = batch_size
+        else:
+            still_faster = False
+        print(f"{batch_size:>8} {xgboost_s * 1000:>11.3f} {numpy_s * 1000:>10.3f} {xgboost_s / numpy_s:>7.1f}x")
+
+    print(f"NUMPY_ENGINE_MAX_BATCH_SIZE={crossover}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import os
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import create_engine, text
+
+CORE_BANKING_POOL_SIZE = int(os.getenv("CORE_BANKING_POOL_SIZE", "5"))
+# Per-phone predictions kept until the core_banking_users row changes
+PHONE_CACHE_SIZE = int(os.getenv("PHONE_PREDICTION_CACHE_SIZE", "10000"))
+
+# core_banking_users column to CreditScoreInput field, mirroring what the
+# NestJS UserController used to send
+FEATURE_COLUMNS = {
+    'age': 'Age',
+    'occupation': 'Occupation',
+    'annual_income': 'Annual_Income',
+    'monthly_inhand_salary': 'Monthly_Inhand_Salary',
+    'num_bank_accounts': 'Num_Bank_Accounts',
+    'num_credit_cards': 'Num_Credit_Card',
+    'interest_rate': 'Interest_Rate',
+    'num_of_loans': 'Num_of_Loan',
+    'type_of_loans': 'Type_of_Loan',
+    'delay_from_due_date': 'Delay_from_due_date',
+    'num_of_delayed_payments': 'Num_of_Delayed_Payment',
+    'changed_credit_limit': 'Changed_Credit_Limit',
+    'num_credit_inquiries': 'Num_Credit_Inquiries',
+    'credit_mix': 'Credit_Mix',
+    'outstanding_debt': 'Outstanding_Debt',
+    'credit_history_age': 'Credit_History_Age',
+    'payment_of_minimum_amount': 'Payment_of_Min_Amount',
+    'total_emi_per_month': 'Total_EMI_per_month',
+    'payment_behaviour': 'Payment_Behaviour',
+    'monthly_balance': 'Monthly_Balance',
+}
+DEFAULT_OCCUPATION = 'Other'
+
+def to_model_features(row):
+    """Map a core_banking_users row to CreditScoreInput field values"""
+    features = {feature: row[column] for column, feature in FEATURE_COLUMNS.items()}
+    if not features['Occupation']:
+        features['Occupation'] = DEFAULT_OCCUPATION
+    return features
+
+class CoreBankingRepository:
+    """Reads core_banking_users rows over a pooled connection"""
+
+    def __init__(self, database_url=None):
+        self.database_url = database_url or os.getenv("DATABASE_URL")
+        self._engine = None
+        self._engine_lock = threading.Lock()
+
+    @property
+    def engine(self):
+        # Created on first use so the service starts without a database
+        if self._engine is None:
+            with self._engine_lock:
+                if self._engine is None:
+                    if not self.database_url:
+                        raise RuntimeError("DATABASE_URL not found in environment variables")
+                    self._engine = create_engine(
+                        self.database_url,
+                        pool_size=CORE_BANKING_POOL_SIZE,
+                        pool_pre_ping=True,
+                    )
+        return self._engine
+
+    def fetch_by_phone(self, phone_number):
+        """The row for phone_number as a dict, or None"""
+        # Served by the core_banking_user_phone_number_index
+        query = text(f"""
+        SELECT {', '.join(FEATURE_COLUMNS)}, updated_at
+        FROM
+            core_banking_users
+        WHERE
+            phone_number = :phone_number
+        LIMIT 1
+        """)
+        with self.engine.connect() as connection:
+            row = connection.execute(query, {"phone_number": phone_number}).mappings().first()
+        return dict(row) if row is not None else None
+
+class PhonePredictionCache:
+    """LRU of phone number to prediction, valid while the row's updated_at and the model are unchanged"""
+
+    def __init__(self, max_size=PHONE_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, phone_number, updated_at, model_version):
+        with self._lock:
+            entry = self._entries.get(phone_number)
+            if entry is None or updated_at is None or entry[:2] != (updated_at, model_version):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(phone_number)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, phone_number, updated_at, model_version, prediction):
+        if updated_at is None or self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[phone_number] = (updated_at, model_version, prediction)
+            self._entries.move_to_end(phone_number)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+core_banking = CoreBankingRepository()
+phone_prediction_cache = PhonePredictionCache()
@@ -0,0 +1,95 @@
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Feature columns encoded from strings before scaling
+CATEGORICAL_COLUMNS = ['Occupation', 'Type_of_Loan']
+# Code used for categories the encoders were not fitted on
+UNKNOWN_CODE = 0
+
+class CategoryEncoder:
+    """Hash-table version of a fitted LabelEncoder
+
+    Encodes a whole column with one vectorized lookup. Categories the encoder
+    was not fitted on map to UNKNOWN_CODE, as before, but are counted.
+    """
+
+    def __init__(self, name, classes):
+        self.name = name
+        self.codes = {category: code for code, category in enumerate(classes.tolist())}
+        self.unknown_count = 0
+        self._lock = threading.Lock()
+
+    def encode(self, values):
+        """Encode a sequence of categories to an int64 array"""
+        mapped = pd.Series(values, dtype=object).map(self.codes)
+        unknown = mapped.isna()
+        unknown_count = int(unknown.sum())
+        if unknown_count:
+            with self._lock:
+                self.unknown_count += unknown_count
+            logger.warning(f"{unknown_count} unknown {self.name} value(s) encoded as {UNKNOWN_CODE}")
+            mapped = mapped.fillna(UNKNOWN_CODE)
+        return mapped.to_numpy(dtype=np.int64)
+
+    def encode_one(self, value):
+        """Encode a single category without going through pandas"""
+        code = self.codes.get(value)
+        if code is None:
+            with self._lock:
+                self.unknown_count += 1
+            logger.warning(f"Unknown {self.name} value encoded as {UNKNOWN_CODE}")
+            return UNKNOWN_CODE
+        return code
+
+class CompiledFeaturePipeline:
+    """Encode and scale one CreditScoreInput straight into a NumPy row
+
+    Equivalent to validate_and_encode followed by scaler.transform on a
+    one-row DataFrame: scaling runs in float64 with the same subtract/divide
+    as StandardScaler, and the result is cast to the float32 XGBoost converts
+    its input to, so predictions are bit-for-bit identical.
+    """
+
+    def __init__(self, scaler, category_encoders):
+        self.feature_names = list(scaler.feature_names_in_)
+        n_features = len(self.feature_names)
+        self.mean = np.asarray(scaler.mean_, dtype=np.float64) if scaler.with_mean else np.zeros(n_features)
+        self.scale = np.asarray(scaler.scale_, dtype=np.float64) if scaler.with_std else np.ones(n_features)
+        self.encoders = [category_encoders.get(name) for name in self.feature_names]
+        # Rows are reused per thread, so a result is valid until the next call
+        # on the same thread
+        self._buffers = threading.local()
+
+    def _row_buffers(self):
+        buffers = self._buffers
+        if not hasattr(buffers, "raw"):
+            buffers.raw = np.empty(len(self.feature_names), dtype=np.float64)
+            buffers.row = np.empty((1, len(self.feature_names)), dtype=np.float32)
+        return buffers.raw, buffers.row
+
+    def transform_one(self, input_data):
+        """(1, n_features) float32 model input for one CreditScoreInput"""
+        raw, row = self._row_buffers()
+        for position, (name, encoder) in enumerate(zip(self.feature_names, self.encoders)):
+            value = getattr(input_data, name)
+            raw[position] = encoder.encode_one(value) if encoder is not None else value
+        np.subtract(raw, self.mean, out=raw)
+        np.divide(raw, self.scale, out=raw)
+        row[0] = raw
+        return row
+
+def compile_category_encoders(encoders):
+    """Build CategoryEncoders for the categorical feature columns"""
+    return {
+        column: CategoryEncoder(column, encoders[column].classes_)
+        for column in CATEGORICAL_COLUMNS
+    }
+
+def compile_label_decoder(encoder):
+    """Array mapping a predicted class number to its label"""
+    return np.asarray(encoder.classes_, dtype=object)
@@ -0,0 +1,103 @@
+import asyncio
+import functools
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Blocking model and pandas work runs here instead of on the event loop. Each
+# kind of work gets its own lane (executor plus concurrency limit), so a burst
+# of recommendation requests cannot take the threads credit scoring needs.
+
+CPU_COUNT = os.cpu_count() or 1
+
+# XGBoost and BLAS release the GIL, so threads scale for prediction work
+PREDICTION_THREADS = int(os.getenv("PREDICTION_THREADS", str(CPU_COUNT)))
+PREDICTION_CONCURRENCY = int(os.getenv("PREDICTION_CONCURRENCY", str(PREDICTION_THREADS * 4)))
+RECOMMENDATION_THREADS = int(os.getenv("RECOMMENDATION_THREADS", str(max(1, CPU_COUNT // 2))))
+RECOMMENDATION_CONCURRENCY = int(os.getenv("RECOMMENDATION_CONCURRENCY", str(RECOMMENDATION_THREADS * 4)))
+# Processes for pandas-heavy work that holds the GIL; 0 keeps it on the
+# prediction threads
+BATCH_PROCESSES = int(os.getenv("BATCH_PROCESSES", "0"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", str(max(1, BATCH_PROCESSES or 2))))
+# Blocking database queries; one thread per pooled core banking connection by
+# default, so a slow database ties up these threads and not the model's
+DATABASE_THREADS = int(os.getenv("DATABASE_THREADS", os.getenv("CORE_BANKING_POOL_SIZE", "5")))
+DATABASE_CONCURRENCY = int(os.getenv("DATABASE_CONCURRENCY", str(DATABASE_THREADS * 4)))
+# Shadow model scoring; work beyond the cap is dropped, never queued
+SHADOW_THREADS = int(os.getenv("SHADOW_THREADS", "1"))
+SHADOW_CONCURRENCY = int(os.getenv("SHADOW_CONCURRENCY", str(SHADOW_THREADS * 4)))
+
+# Set by the batch pool's initializer, so only in its worker processes; uvicorn
+# --workers and --reload children have a parent process too, but are not these
+_batch_worker = False
+
+def _init_batch_worker():
+    global _batch_worker
+    _batch_worker = True
+
+def in_batch_worker():
+    """True inside a BATCH_PROCESSES worker process"""
+    return _batch_worker
+
+class ExecutorLane:
+    """An executor with a cap on how many calls may be queued or running"""
+
+    def __init__(self, name, executor, max_concurrency):
+        self.name = name
+        self.executor = executor
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+
+    @property
+    def full(self):
+        return self.in_flight >= self.max_concurrency
+
+    async def run(self, func, *args, **kwargs):
+        """Run func in the lane's executor, waiting for a slot if the lane is full"""
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+            finally:
+                self.in_flight -= 1
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+prediction_lane = ExecutorLane(
+    "prediction",
+    ThreadPoolExecutor(max_workers=PREDICTION_THREADS, thread_name_prefix="prediction"),
+    PREDICTION_CONCURRENCY,
+)
+recommendation_lane = ExecutorLane(
+    "recommendation",
+    ThreadPoolExecutor(max_workers=RECOMMENDATION_THREADS, thread_name_prefix="recommendation"),
+    RECOMMENDATION_CONCURRENCY,
+)
+database_lane = ExecutorLane(
+    "database",
+    ThreadPoolExecutor(max_workers=DATABASE_THREADS, thread_name_prefix="database"),
+    DATABASE_CONCURRENCY,
+)
+shadow_lane = ExecutorLane(
+    "shadow",
+    ThreadPoolExecutor(max_workers=SHADOW_THREADS, thread_name_prefix="shadow"),
+    SHADOW_CONCURRENCY,
+)
+if BATCH_PROCESSES > 0:
+    batch_lane = ExecutorLane(
+        "batch",
+        ProcessPoolExecutor(max_workers=BATCH_PROCESSES, initializer=_init_batch_worker),
+        BATCH_CONCURRENCY,
+    )
+else:
+    batch_lane = ExecutorLane("batch", prediction_lane.executor, BATCH_CONCURRENCY)
+
+def shutdown_lanes():
+    """Wait for running work and stop every lane's executor"""
+    for lane in (batch_lane, shadow_lane, database_lane, recommendation_lane, prediction_lane):
+        lane.shutdown()
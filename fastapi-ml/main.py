@@ -1,12 +1,21 @@
-from fastapi import FastAPI, HTTPException
+import time
+
+from startup_report import StartupReport
+
+# Startup timing starts before the heavy imports below
+startup_report = StartupReport()
+imports_started = time.perf_counter()
+
+from fastapi import FastAPI, Header, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-from typing import Optional, List
+from pydantic import BaseModel, Field, ValidationError, model_validator
+from typing import Optional, List, Dict, Any
+from contextlib import asynccontextmanager
+import asyncio
 import pandas as pd
-import pickle
 import os
-import uvicorn
 import logging
+import threading
 import warnings
 
 # Filter out various warnings
@@ -17,11 +26,75 @@ warnings.filterwarnings("ignore", message=".*serialized model.*")
 
 # Import the similar houses recommender
 from similar_houses import recommender
+from executors import batch_lane, database_lane, in_batch_worker, prediction_lane, recommendation_lane, shadow_lane, shutdown_lanes
+from model_registry import ModelRegistry
+from model_experiments import ModelExperiments, score_shadow
+from prediction_cache import PREDICTION_CACHE_SIZE, PredictionCache
+from core_banking import core_banking, phone_prediction_cache, to_model_features
+
+imports_seconds = time.perf_counter() - imports_started
+
+def load_catalog(start_background=True):
+    """Load the similar houses catalog and record how long it took"""
+    started = time.perf_counter()
+    recommender.initialize(start_background=start_background)
+    error = "No houses loaded" if recommender.df.empty else None
+    startup_report.record("catalog_load", time.perf_counter() - started, error=error)
+
+def preload():
+    """Load the catalog and the credit models without starting any thread
+
+    Called by server.py before it forks the workers, which then share what
+    was loaded copy-on-write instead of each loading their own copy.
+    """
+    load_catalog(start_background=False)
+    with startup_report.phase("artifact_load"):
+        model_registry.load()
+        model_experiments.configure_from_env()
+    with startup_report.phase("warm_up"):
+        model_registry.warm_up()
+
+def refresh_preloaded():
+    """Bring preloaded models and catalog up to date before new workers are forked
+
+    This also recomputes and saves the neighbour table when the catalog
+    changed; the master is its only owner.
+    """
+    model_registry.reload_if_changed()
+    if recommender.engine is not None:
+        recommender.refresh_data()
+
+@asynccontextmanager
+async def lifespan(app):
+    if model_registry.active is None:
+        # The catalog loads on its own daemon thread and is not awaited, so
+        # credit scoring is served without waiting for the database, or when
+        # it is down
+        threading.Thread(target=load_catalog, name="catalog-load", daemon=True).start()
+
+        with startup_report.phase("artifact_load"):
+            await asyncio.to_thread(model_registry.load)
+            await asyncio.to_thread(model_experiments.configure_from_env)
+        with startup_report.phase("warm_up"):
+            await asyncio.to_thread(model_registry.warm_up)
+    else:
+        # Forked from a server.py master after preload(): only this process's
+        # background threads are missing
+        recommender.after_fork()
+    model_registry.start_watching()
+    startup_report.mark_ready()
+
+    yield
+
+    model_registry.stop_watching()
+    recommender.stop_background_refresh()
+    shutdown_lanes()
 
 app = FastAPI(
     title="Huniya ML API",
     description="API for credit score prediction and similar houses recommendation",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -38,19 +111,15 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
 )
 logger = logging.getLogger(__name__)
+startup_report.record("imports", imports_seconds)
 
-# Load credit score prediction model
-try:
-    model_path = os.path.join(os.path.dirname(__file__), './models/model_xgb_creditscore.pkl')
-    encoders_path = os.path.join(os.path.dirname(__file__), './models/encoders_creditscore.pkl')
-    scaler_path = os.path.join(os.path.dirname(__file__), './models/scaler_creditscore.pkl')
-
-    model = pickle.load(open(model_path, 'rb'))
-    encoders = pickle.load(open(encoders_path, 'rb'))
-    scaler = pickle.load(open(scaler_path, 'rb'))
-except Exception as e:
-    logger.error(f"Error loading credit score models: {e}")
-    raise
+# Required in the X-Admin-Token header of the model admin endpoints, which are
+# disabled while it is unset
+MODEL_ADMIN_TOKEN = os.getenv("MODEL_ADMIN_TOKEN")
+# Readiness: whether traffic waits for the catalog, and how stale it may get
+# (0 means no limit)
+READY_REQUIRE_CATALOG = os.getenv("READY_REQUIRE_CATALOG", "true").lower() == "true"
+READY_MAX_SNAPSHOT_AGE_SECONDS = float(os.getenv("READY_MAX_SNAPSHOT_AGE_SECONDS", "0"))
 
 # Credit score input model
 class CreditScoreInput(BaseModel):
@@ -101,10 +170,42 @@ class CreditScoreInput(BaseModel):
             }
         }
 
+class PhoneNumberInput(BaseModel):
+    phone_number: str = Field(..., min_length=1, description="core_banking_users.phone_number of the customer")
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "phone_number": "+998901234567"
+            }
+        }
+
+# Credit score prediction model, loaded at startup; new versions are swapped
+# in by the registry
+model_registry = ModelRegistry(
+    canary_input=CreditScoreInput(**CreditScoreInput.Config.schema_extra["example"]),
+    required_features=CreditScoreInput.model_fields,
+    run=prediction_lane.run,
+)
+
+# Challenger (A/B) and shadow models compared against the active one
+model_experiments = ModelExperiments(model_registry)
+
+class CreditScoreBatchInput(BaseModel):
+    # Rows are validated one by one so a bad row does not fail the whole batch
+    rows: List[Dict[str, Any]] = Field(..., max_length=10000, description="CreditScoreInput objects to score")
+
 # Similar houses input model
 class HouseIndexInput(BaseModel):
-    index: int
-    
+    index: Optional[int] = Field(None, description="houses.index of the anchor house")
+    id: Optional[int] = Field(None, description="houses.id of the anchor house, alternative to index")
+
+    @model_validator(mode="after")
+    def check_anchor(self):
+        if (self.index is None) == (self.id is None):
+            raise ValueError("Provide exactly one of index or id")
+        return self
+
     class Config:
         schema_extra = {
             "example": {
@@ -112,66 +213,413 @@ class HouseIndexInput(BaseModel):
             }
         }
 
+class ModelReloadInput(BaseModel):
+    version: Optional[str] = Field(None, description="Native artifact version to activate, CURRENT by default")
+
+class ExperimentConfigInput(BaseModel):
+    challenger_version: Optional[str] = Field(None, description="Native version to serve part of the traffic")
+    challenger_fraction: float = Field(0.0, ge=0.0, le=1.0, description="Fraction of requests served by the challenger")
+    shadow_versions: List[str] = Field([], description="Native versions scored after each response")
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "challenger_version": "7094baeb67bf",
+                "challenger_fraction": 0.1,
+                "shadow_versions": []
+            }
+        }
+
+class HouseBatchInput(BaseModel):
+    indexes: Optional[List[int]] = Field(None, max_length=200, description="houses.index of each anchor house")
+    ids: Optional[List[int]] = Field(None, max_length=200, description="houses.id of each anchor house, alternative to indexes")
+
+    @model_validator(mode="after")
+    def check_anchors(self):
+        if (self.indexes is None) == (self.ids is None):
+            raise ValueError("Provide exactly one of indexes or ids")
+        return self
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "ids": [1, 2, 3]
+            }
+        }
+
 # Response models
 class PredictionResponse(BaseModel):
     status: str
     prediction: str
+    model_version: str
+
+class PhonePredictionResponse(BaseModel):
+    status: str
+    prediction: str
+    model_version: str
+    cached: bool
+
+class BatchPredictionItem(BaseModel):
+    row: int
+    status: str
+    prediction: Optional[str] = None
+    error: Optional[str] = None
+
+class BatchPredictionResponse(BaseModel):
+    status: str
+    model_version: Optional[str] = None
+    succeeded: int
+    failed: int
+    results: List[BatchPredictionItem]
 
 class SimilarHouseResponse(BaseModel):
     similar_houses: List[int]
 
+class SimilarHousesBatchResponse(BaseModel):
+    similar_houses: Dict[int, List[int]]
+
+class PredictionStatsResponse(BaseModel):
+    model_version: str
+    unknown_categories: Dict[str, int]
+    batching: Optional[Dict[str, float]] = None
+    cache: Optional[Dict[str, int]] = None
+    phone_cache: Dict[str, int]
+
+class ModelStatusResponse(BaseModel):
+    model_version: Optional[str] = None
+    name: Optional[str] = None
+    loaded_at: Optional[float] = None
+    previous_version: Optional[str] = None
+    reloads: int
+    last_reload_error: Optional[str] = None
+    watch_interval_seconds: float
+    inference_engine: Optional[Dict[str, Any]] = None
+
+class ExperimentStatsResponse(BaseModel):
+    active_version: str
+    challenger_version: Optional[str] = None
+    challenger_fraction: float
+    shadow_versions: List[str]
+    models: Dict[str, Dict[str, Optional[Dict[str, Any]]]]
+    agreement: List[Dict[str, Any]]
+    shadow_dropped: int
+    shadow_errors: int
+
+class StartupReportResponse(BaseModel):
+    started_at: float
+    ready_seconds: Optional[float] = None
+    phases: Dict[str, float]
+    errors: Dict[str, str]
+
+class ReadinessResponse(BaseModel):
+    ready: bool
+    checks: Dict[str, bool]
+    model_version: Optional[str] = None
+    snapshot_age_seconds: Optional[float] = None
+    row_count: int
+
 class HealthResponse(BaseModel):
     status: str
 
-# Encode Occupation and Type of Loan
-def validate_and_encode(dummy_df, encoders_dict):
-    dummy_encoded = dummy_df.copy()
-    for col in ['Occupation', 'Type_of_Loan']:
-        if col in dummy_encoded.columns:
-            valid_classes = list(encoders_dict[col].classes_)
-            dummy_encoded[col] = dummy_encoded[col].apply(
-                lambda x: encoders_dict[col].transform([x])[0] if x in valid_classes else 0
-            )
-    return dummy_encoded
+class CatalogStatusResponse(BaseModel):
+    loaded: bool
+    row_count: int
+    loaded_at: Optional[float] = None
+    age_seconds: Optional[float] = None
+    refresh_interval_seconds: float
+    sync_mode: str
+    notifications_applied: int
+    full_synced_at: Optional[float] = None
+    watermark: Optional[str] = None
+    last_refresh_error: Optional[str] = None
+    neighbour_table_current: bool
+    similarity_backend: str
+
+def predict_frame(input_df):
+    """Predict every row of input_df with the active model; returns (labels, version)"""
+    if in_batch_worker():
+        # Batch worker processes hold their own registry, loaded on first use,
+        # and do not watch
+        if model_registry.active is None:
+            model_registry.load()
+        model_registry.reload_if_changed()
+    bundle = model_registry.active
+    return bundle.predict_frame(input_df), bundle.version
+
+# Repeated identical inputs are answered without running the model
+prediction_cache = PredictionCache() if PREDICTION_CACHE_SIZE > 0 else None
+
+async def score_row(bundle, row):
+    """Predict one encoded and scaled (1, n_features) row with bundle's model"""
+    if bundle.coalescer is not None:
+        return await bundle.coalescer.submit(row)
+    prediction = await prediction_lane.run(bundle.predict_rows, row)
+    return prediction[0]
+
+async def score_input(input_data, bundle=None):
+    """Encode, scale and predict through the compiled feature pipeline
+
+    Returns (prediction, model_version). Uses the active bundle unless another
+    is given; it is taken once, so a model swapped in meanwhile does not
+    affect this request.
+    """
+    bundle = bundle or model_registry.active
+    if prediction_cache is None and bundle.coalescer is None:
+        return await prediction_lane.run(bundle.predict_one, input_data), bundle.version
+
+    # Our own copy, since the pipeline reuses its row buffer on the next call
+    row = bundle.feature_pipeline.transform_one(input_data).copy()
+    if prediction_cache is None:
+        return await score_row(bundle, row), bundle.version
+    key = prediction_cache.make_key(row, bundle.version)
+    return await prediction_cache.get_or_compute(key, lambda: score_row(bundle, row)), bundle.version
+
+# Shadow scoring tasks, referenced until done so they are not collected early
+shadow_tasks = set()
+
+async def run_shadows(bundles, input_data, reference_version, reference):
+    """Score input_data with each bundle and compare to the served prediction"""
+    for bundle in bundles:
+        # Drop rather than queue, so shadow work never backs up
+        if shadow_lane.full:
+            model_experiments.record_shadow_dropped()
+            continue
+        try:
+            await shadow_lane.run(score_shadow, model_experiments, bundle, input_data, reference_version, reference)
+        except Exception as e:
+            model_experiments.record_shadow_error()
+            logger.warning(f"Shadow prediction with model {bundle.version} failed: {e}")
+
+def schedule_shadows(bundles, input_data, reference_version, reference):
+    # A detached task rather than BackgroundTasks: those hold the connection
+    # until they finish, delaying the next request on a keep-alive connection
+    task = asyncio.get_running_loop().create_task(run_shadows(bundles, input_data, reference_version, reference))
+    shadow_tasks.add(task)
+    task.add_done_callback(shadow_tasks.discard)
+
+async def score_routed(input_data, bundle):
+    """Score with the bundle model_experiments.route() picked, recording it and scheduling comparisons"""
+    started = time.perf_counter()
+    credit_score, model_version = await score_input(input_data, bundle)
+    model_experiments.record_served(model_version, time.perf_counter() - started)
+
+    comparisons = model_experiments.comparisons(bundle)
+    if comparisons:
+        schedule_shadows(comparisons, input_data, model_version, credit_score)
+    return credit_score, model_version
+
+def check_admin_token(token):
+    if not MODEL_ADMIN_TOKEN:
+        raise HTTPException(status_code=503, detail="Model admin endpoints are disabled, MODEL_ADMIN_TOKEN is not set")
+    if token != MODEL_ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
 
 @app.post("/api/predict/profile-risk", response_model=PredictionResponse, tags=["prediction"])
 async def predict_score(input_data: CreditScoreInput):
     try:
-        # Convert input to dataframe
-        input_df = pd.DataFrame([input_data.dict()])
-        
-        # Process the data
-        df_encoded = validate_and_encode(input_df, encoders)
-        df_scaled = scaler.transform(df_encoded)
-        
-        # Make prediction
-        prediction = model.predict(df_scaled)
-        credit_score = encoders['Credit_Score'].inverse_transform([prediction[0]])[0]
+        credit_score, model_version = await score_routed(input_data, model_experiments.route())
         
         # Return prediction
         return {
             "status": "success",
-            "prediction": credit_score
+            "prediction": credit_score,
+            "model_version": model_version
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
 
+@app.post("/api/predict/profile-risk/by-phone", response_model=PhonePredictionResponse, tags=["prediction"])
+async def predict_score_by_phone(input_data: PhoneNumberInput):
+    phone_number = input_data.phone_number
+    try:
+        row = await database_lane.run(core_banking.fetch_by_phone, phone_number)
+    except Exception as e:
+        logger.error(f"Error reading core banking user: {e}")
+        raise HTTPException(status_code=503, detail=f"Core banking lookup error: {str(e)}")
+    if row is None:
+        raise HTTPException(status_code=404, detail="User not found in core banking")
+
+    # Routed like /api/predict/profile-risk; the last prediction of the routed
+    # model is reused while the row has not changed
+    bundle = model_experiments.route()
+    model_version = bundle.version
+    credit_score = phone_prediction_cache.get(phone_number, row["updated_at"], model_version)
+    if credit_score is not None:
+        return {"status": "success", "prediction": credit_score, "model_version": model_version, "cached": True}
+
+    try:
+        features = CreditScoreInput(**to_model_features(row))
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=f"Core banking row is not a valid model input: {str(e)}")
+
+    try:
+        credit_score, model_version = await score_routed(features, bundle)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
+
+    phone_prediction_cache.put(phone_number, row["updated_at"], model_version, credit_score)
+    return {"status": "success", "prediction": credit_score, "model_version": model_version, "cached": False}
+
+def score_batch_rows(rows):
+    """Validate and score raw batch rows; returns (per-row results, rows scored, model version)
+
+    Runs on the batch lane, so neither validation nor building the frame
+    blocks the event loop.
+    """
+    results = [None] * len(rows)
+    model_version = None
+    valid_rows = []
+    valid_positions = []
+
+    for position, row in enumerate(rows):
+        try:
+            valid_rows.append(CreditScoreInput(**row).dict())
+            valid_positions.append(position)
+        except ValidationError as e:
+            errors = "; ".join(
+                f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()
+            )
+            results[position] = {"row": position, "status": "error", "error": errors}
+
+    if valid_rows:
+        credit_scores, model_version = predict_frame(pd.DataFrame(valid_rows))
+        for position, credit_score in zip(valid_positions, credit_scores):
+            results[position] = {"row": position, "status": "success", "prediction": credit_score}
+
+    return results, len(valid_rows), model_version
+
+@app.post("/api/predict/profile-risk/batch", response_model=BatchPredictionResponse, tags=["prediction"])
+async def predict_score_batch(input_data: CreditScoreBatchInput):
+    try:
+        results, succeeded, model_version = await batch_lane.run(score_batch_rows, input_data.rows)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
+
+    return {
+        "status": "success",
+        "model_version": model_version,
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "results": results,
+    }
+
+@app.get("/api/predict/stats", response_model=PredictionStatsResponse, tags=["prediction"])
+async def get_prediction_stats():
+    bundle = model_registry.active
+    return {
+        "model_version": bundle.version,
+        "unknown_categories": {
+            column: encoder.unknown_count for column, encoder in bundle.category_encoders.items()
+        },
+        "batching": bundle.coalescer.stats() if bundle.coalescer is not None else None,
+        "cache": prediction_cache.stats() if prediction_cache is not None else None,
+        "phone_cache": phone_prediction_cache.stats(),
+    }
+
+@app.get("/api/models/status", response_model=ModelStatusResponse, tags=["models"])
+async def get_model_status():
+    return model_registry.status()
+
+@app.post("/api/models/reload", response_model=ModelStatusResponse, tags=["models"])
+async def reload_model(input_data: ModelReloadInput, x_admin_token: Optional[str] = Header(None)):
+    check_admin_token(x_admin_token)
+    try:
+        # Loading and the canary run off the event loop; requests keep being
+        # served by the current model until the swap
+        await asyncio.to_thread(model_registry.reload, input_data.version)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=f"Model reload failed: {str(e)}")
+    return model_registry.status()
+
+@app.get("/api/models/experiments", response_model=ExperimentStatsResponse, tags=["models"])
+async def get_model_experiments():
+    return model_experiments.stats()
+
+@app.post("/api/models/experiments", response_model=ExperimentStatsResponse, tags=["models"])
+async def configure_model_experiments(input_data: ExperimentConfigInput, x_admin_token: Optional[str] = Header(None)):
+    check_admin_token(x_admin_token)
+    try:
+        await asyncio.to_thread(
+            model_experiments.configure,
+            input_data.challenger_version,
+            input_data.challenger_fraction,
+            input_data.shadow_versions,
+        )
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=f"Experiment setup failed: {str(e)}")
+    return model_experiments.stats()
+
 # Add the new endpoint for similar houses recommendations
 @app.post("/api/similar-houses/", response_model=SimilarHouseResponse, tags=["recommendation"])
 async def get_similar_houses(input_data: HouseIndexInput):
     try:
-        similar_indices = recommender.get_similar_houses(input_data.index)
+        similar_indices = await recommendation_lane.run(
+            recommender.get_similar_houses, input_data.index, house_id=input_data.id
+        )
         return {"similar_houses": similar_indices}
     except Exception as e:
         logger.error(f"Error getting similar houses: {e}")
         raise HTTPException(status_code=500, detail=f"Error recommending similar houses: {str(e)}")
 
+@app.post("/api/similar-houses/batch", response_model=SimilarHousesBatchResponse, tags=["recommendation"])
+async def get_similar_houses_batch(input_data: HouseBatchInput):
+    try:
+        similar_houses = await recommendation_lane.run(
+            recommender.get_similar_houses_batch, input_data.indexes, house_ids=input_data.ids
+        )
+        return {"similar_houses": similar_houses}
+    except Exception as e:
+        logger.error(f"Error getting similar houses batch: {e}")
+        raise HTTPException(status_code=500, detail=f"Error recommending similar houses: {str(e)}")
+
+@app.get("/api/similar-houses/status", response_model=CatalogStatusResponse, tags=["recommendation"])
+async def get_catalog_status():
+    return recommender.status()
+
+@app.get("/api/startup", response_model=StartupReportResponse, tags=["health"])
+async def get_startup_report():
+    return startup_report.to_dict()
+
 @app.get("/health", response_model=HealthResponse, tags=["health"])
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/ready", response_model=ReadinessResponse, tags=["health"])
+async def readiness_check(response: Response):
+    # Liveness is /health; this only passes once the replica can serve well
+    snapshot = recommender.snapshot
+    age_seconds = snapshot.age_seconds
+    bundle = model_registry.active
+    checks = {
+        "model_warm": bundle is not None and model_registry.warmed,
+        # Loaded even when the houses table is empty
+        "catalog_loaded": snapshot.loaded_at is not None or not READY_REQUIRE_CATALOG,
+        "catalog_fresh": (
+            READY_MAX_SNAPSHOT_AGE_SECONDS <= 0
+            or snapshot.loaded_at is None and not READY_REQUIRE_CATALOG
+            or age_seconds is not None and age_seconds <= READY_MAX_SNAPSHOT_AGE_SECONDS
+        ),
+    }
+    ready = all(checks.values())
+    if not ready:
+        response.status_code = 503
+    return {
+        "ready": ready,
+        "checks": checks,
+        "model_version": bundle.version if bundle is not None else None,
+        "snapshot_age_seconds": age_seconds,
+        "row_count": len(snapshot.df),
+    }
+
+# Single-process development server with auto-reload; production runs server.py
 if __name__ == "__main__":
+    import uvicorn
+
     port = int(os.getenv("PORT", 5000))
     logger.info(f"Starting FastAPI ML service on port 5000")
     uvicorn.run("main:app", host="0.0.0.0", port=5000, reload=True)
\ No newline at end of file
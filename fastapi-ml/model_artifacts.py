@@ -0,0 +1,290 @@
+import argparse
+import hashlib
+import json
+import logging
+import mmap
+import os
+import pickle
+import shutil
+import struct
+import time
+import zipfile
+
+import numpy as np
+import sklearn
+import xgboost as xgb
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+logger = logging.getLogger(__name__)
+
+# Credit score artifacts in a native, pickle-free format. Each version is a
+# directory holding the booster as XGBoost UBJSON, an uncompressed .npz of
+# scaler parameters and encoder class tables, and a manifest with checksums;
+# CURRENT names the version to load. The .npz members are memory-mapped.
+
+MODELS_DIR = os.path.join(os.path.dirname(__file__), 'models')
+NATIVE_DIR = os.path.join(MODELS_DIR, 'credit')
+PICKLE_FILES = ['model_xgb_creditscore.pkl', 'encoders_creditscore.pkl', 'scaler_creditscore.pkl']
+
+FORMAT_VERSION = 1
+CURRENT_FILE = "CURRENT"
+BOOSTER_FILE = "booster.ubj"
+PREPROCESSING_FILE = "preprocessing.npz"
+MANIFEST_FILE = "manifest.json"
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _pack_strings(values):
+    # One NUL-separated UTF-8 buffer: compact, mappable and split in one C
+    # call on load, unlike a pickled object array
+    values = [str(value) for value in values]
+    if any('\0' in value for value in values):
+        raise ValueError("Strings containing NUL cannot be stored")
+    data = np.frombuffer('\0'.join(values).encode('utf-8'), dtype=np.uint8)
+    return data, np.asarray(len(values), dtype=np.int64)
+
+def _unpack_strings(data, count):
+    if int(count) == 0:
+        return np.empty(0, dtype=object)
+    return np.array(data.tobytes().decode('utf-8').split('\0'), dtype=object)
+
+def _map_npz(path):
+    """Arrays of an uncompressed .npz, memory-mapped in place"""
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as f:
+        # One read-only mapping of the whole file, shared by every member
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        for info in archive.infolist():
+            name = info.filename[:-len('.npy')]
+            if info.compress_type != zipfile.ZIP_STORED:
+                with archive.open(info) as member:
+                    arrays[name] = np.load(member)
+                continue
+
+            # Skip the member's local header to reach the .npy bytes
+            f.seek(info.header_offset + 26)
+            name_length, extra_length = struct.unpack('<HH', f.read(4))
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+
+            if dtype.hasobject:
+                raise ValueError(f"{path} member {name} holds Python objects")
+            arrays[name] = np.ndarray(
+                shape, dtype=dtype, buffer=mapping, offset=f.tell(), order='F' if fortran_order else 'C',
+            )
+    return arrays
+
+def load_pickle_artifacts(models_dir=MODELS_DIR):
+    """Unpickle the credit score model, its encoders and its scaler"""
+    artifacts = []
+    for name in PICKLE_FILES:
+        with open(os.path.join(models_dir, name), 'rb') as f:
+            artifacts.append(pickle.load(f))
+    model, encoders, scaler = artifacts
+    return model, encoders, scaler
+
+def pickle_version(models_dir=MODELS_DIR):
+    """Short content hash of the pickled model, encoder and scaler files"""
+    digest = hashlib.sha256()
+    for name in PICKLE_FILES:
+        digest.update(_sha256(os.path.join(models_dir, name)).encode())
+    return digest.hexdigest()[:12]
+
+def save_native_artifacts(model, encoders, scaler, directory=NATIVE_DIR, source=None):
+    """Write the artifacts as a new native version under directory and make it current"""
+    name = write_native_artifacts(model, encoders, scaler, directory, source)
+    set_current_version(directory, name)
+    return name
+
+def write_native_artifacts(model, encoders, scaler, directory=NATIVE_DIR, source=None):
+    """Write the artifacts as a native version under directory without making it current
+
+    Returns the version's directory name, for set_current_version.
+    """
+    os.makedirs(directory, exist_ok=True)
+    staging = os.path.join(directory, f".staging-{os.getpid()}.tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    try:
+        # The sklearn wrapper keeps its class metadata in the saved model
+        model.save_model(os.path.join(staging, BOOSTER_FILE))
+
+        arrays = {
+            "scaler_mean": np.asarray(scaler.mean_, dtype=np.float64),
+            "scaler_scale": np.asarray(scaler.scale_, dtype=np.float64),
+            "scaler_var": np.asarray(scaler.var_, dtype=np.float64),
+            "scaler_n_samples_seen": np.asarray(scaler.n_samples_seen_, dtype=np.int64),
+        }
+        arrays["feature_names_data"], arrays["feature_names_count"] = _pack_strings(scaler.feature_names_in_)
+        for name, encoder in encoders.items():
+            arrays[f"encoder_{name}_data"], arrays[f"encoder_{name}_count"] = _pack_strings(encoder.classes_)
+        # Uncompressed, so every member can be memory-mapped
+        np.savez(os.path.join(staging, PREPROCESSING_FILE), **arrays)
+
+        files = {name: _sha256(os.path.join(staging, name)) for name in (BOOSTER_FILE, PREPROCESSING_FILE)}
+        version = hashlib.sha256("".join(files[name] for name in sorted(files)).encode()).hexdigest()[:12]
+        manifest = {
+            "format_version": FORMAT_VERSION,
+            "version": version,
+            "created_at": time.time(),
+            "source": source,
+            "xgboost_version": xgb.__version__,
+            "sklearn_version": sklearn.__version__,
+            "feature_names": [str(name) for name in scaler.feature_names_in_],
+            "encoders": list(encoders),
+            "scaler": {"with_mean": bool(scaler.with_mean), "with_std": bool(scaler.with_std)},
+            "files": files,
+        }
+        with open(os.path.join(staging, MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        name = f"credit-{version}"
+        target = os.path.join(directory, name)
+        if os.path.exists(target):
+            # Same content as an existing version, just make it current again
+            shutil.rmtree(staging)
+        else:
+            os.rename(staging, target)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    logger.info(f"Wrote credit score artifacts {name}")
+    return name
+
+def set_current_version(directory, name):
+    """Atomically point CURRENT at the version name; watchers pick it up from there"""
+    pointer = os.path.join(directory, f".{CURRENT_FILE}.{os.getpid()}")
+    with open(pointer, "w") as f:
+        f.write(name)
+    os.replace(pointer, os.path.join(directory, CURRENT_FILE))
+    logger.info(f"Credit score artifacts {name} are now current")
+
+def load_native_artifacts(directory=NATIVE_DIR, name=None, verify=True):
+    """Load a native artifact version, the current one by default
+
+    Returns (model, encoders, scaler, manifest), or None if there is no
+    current version. Checksums are checked against the manifest unless
+    verify is False.
+    """
+    if name is None:
+        try:
+            with open(os.path.join(directory, CURRENT_FILE)) as f:
+                name = f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    path = os.path.join(directory, name)
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    if manifest["format_version"] != FORMAT_VERSION:
+        raise ValueError(f"Credit score artifacts {name} have format {manifest['format_version']}")
+
+    booster_path = os.path.join(path, BOOSTER_FILE)
+    preprocessing_path = os.path.join(path, PREPROCESSING_FILE)
+    if verify:
+        for file_name, expected in manifest["files"].items():
+            if _sha256(os.path.join(path, file_name)) != expected:
+                raise ValueError(f"Checksum mismatch for {file_name} in credit score artifacts {name}")
+
+    model = xgb.XGBClassifier()
+    model.load_model(booster_path)
+
+    arrays = _map_npz(preprocessing_path)
+    feature_names = _unpack_strings(arrays["feature_names_data"], arrays["feature_names_count"])
+
+    scaler = StandardScaler(with_mean=manifest["scaler"]["with_mean"], with_std=manifest["scaler"]["with_std"])
+    scaler.mean_ = arrays["scaler_mean"]
+    scaler.scale_ = arrays["scaler_scale"]
+    scaler.var_ = arrays["scaler_var"]
+    n_samples_seen = arrays["scaler_n_samples_seen"]
+    scaler.n_samples_seen_ = int(n_samples_seen) if n_samples_seen.ndim == 0 else np.asarray(n_samples_seen)
+    scaler.n_features_in_ = len(feature_names)
+    scaler.feature_names_in_ = feature_names
+
+    encoders = {}
+    for encoder_name in manifest["encoders"]:
+        encoder = LabelEncoder()
+        encoder.classes_ = _unpack_strings(arrays[f"encoder_{encoder_name}_data"], arrays[f"encoder_{encoder_name}_count"])
+        encoders[encoder_name] = encoder
+
+    return model, encoders, scaler, manifest
+
+def load_credit_artifacts(models_dir=MODELS_DIR):
+    """(model, encoders, scaler, version) of the credit score model
+
+    Prefers the current native version under models_dir/credit and falls back
+    to the pickles.
+    """
+    native = load_native_artifacts(os.path.join(models_dir, 'credit'))
+    if native is not None:
+        model, encoders, scaler, manifest = native
+        logger.info(f"Loaded native credit score artifacts {manifest['version']}")
+        return model, encoders, scaler, manifest["version"]
+
+    logger.warning("No native credit score artifacts, loading pickles; run `python model_artifacts.py convert`")
+    model, encoders, scaler = load_pickle_artifacts(models_dir)
+    return model, encoders, scaler, pickle_version(models_dir)
+
+def _check_parity(source, converted, rows=1000, seed=0):
+    # Score scaled rows around the training distribution with both models
+    model, encoders, scaler = source
+    native_model, native_encoders, native_scaler, _ = converted
+    for name, encoder in encoders.items():
+        if not np.array_equal(encoder.classes_.astype(str), native_encoders[name].classes_.astype(str)):
+            raise ValueError(f"Encoder {name} classes differ after conversion")
+    for attribute in ("mean_", "scale_", "var_"):
+        if not np.array_equal(getattr(scaler, attribute), getattr(native_scaler, attribute)):
+            raise ValueError(f"Scaler {attribute} differs after conversion")
+
+    sample = np.random.default_rng(seed).normal(size=(rows, len(scaler.feature_names_in_))).astype(np.float32)
+    if not np.array_equal(model.predict(sample), native_model.predict(sample)):
+        raise ValueError("Converted booster predicts differently")
+    if not np.array_equal(model.predict_proba(sample), native_model.predict_proba(sample)):
+        raise ValueError("Converted booster gives different probabilities")
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage native credit score model artifacts")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    convert = subcommands.add_parser("convert", help="convert the pickled artifacts to the native format")
+    convert.add_argument("--models-dir", default=MODELS_DIR)
+    convert.add_argument("--output-dir", default=None, help="defaults to <models-dir>/credit")
+    verify = subcommands.add_parser("verify", help="check the checksums of the current native version")
+    verify.add_argument("--models-dir", default=MODELS_DIR)
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    )
+
+    if args.command == "convert":
+        output_dir = args.output_dir or os.path.join(args.models_dir, 'credit')
+        source = load_pickle_artifacts(args.models_dir)
+        name = write_native_artifacts(*source, directory=output_dir, source=pickle_version(args.models_dir))
+        # CURRENT is only repointed once the written version matches the
+        # pickles, so a diverging conversion is never picked up by a watcher
+        try:
+            _check_parity(source, load_native_artifacts(output_dir, name))
+        except ValueError as e:
+            raise SystemExit(f"Not publishing {os.path.join(output_dir, name)}: {e}")
+        set_current_version(output_dir, name)
+        logger.info(f"Converted pickles to {os.path.join(output_dir, name)}; predictions match")
+    else:
+        native = load_native_artifacts(os.path.join(args.models_dir, 'credit'))
+        if native is None:
+            raise SystemExit("No native credit score artifacts found")
+        logger.info(f"Credit score artifacts {native[3]['version']} verified")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import bisect
+import logging
+import os
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# A/B: fraction of /api/predict/profile-risk and /by-phone traffic served by the
+# challenger
+CHALLENGER_MODEL_VERSION = os.getenv("CHALLENGER_MODEL_VERSION") or None
+CHALLENGER_TRAFFIC_FRACTION = float(os.getenv("CHALLENGER_TRAFFIC_FRACTION", "0"))
+# Shadow: comma-separated versions scored after the response has been sent
+SHADOW_MODEL_VERSIONS = [version for version in os.getenv("SHADOW_MODEL_VERSIONS", "").split(",") if version]
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+LATENCY_BUCKETS_MS = [0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000]
+
+class LatencyHistogram:
+    """Fixed-bucket histogram of durations"""
+
+    def __init__(self, buckets_ms=LATENCY_BUCKETS_MS):
+        self.buckets_ms = list(buckets_ms)
+        # One count per bucket plus one for everything above the last bound
+        self.counts = [0] * (len(self.buckets_ms) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+
+    def record(self, seconds):
+        elapsed_ms = seconds * 1000
+        self.counts[bisect.bisect_left(self.buckets_ms, elapsed_ms)] += 1
+        self.count += 1
+        self.total_ms += elapsed_ms
+
+    def to_dict(self):
+        bounds = [str(bound) for bound in self.buckets_ms] + ["+Inf"]
+        return {
+            "count": self.count,
+            "mean_ms": self.total_ms / self.count if self.count else 0.0,
+            "buckets_ms": dict(zip(bounds, self.counts)),
+        }
+
+class ModelExperiments:
+    """Challenger and shadow credit models evaluated next to the active one
+
+    A fraction of requests is served by the challenger (A/B). Shadow models,
+    and the active model for challenger-served requests, score the same input
+    after the response has been sent, and their agreement with the served
+    prediction is counted. Statistics are updated from the event loop and
+    from shadow threads, hence the lock.
+    """
+
+    def __init__(self, registry):
+        self.registry = registry
+        self.challenger = None
+        self.challenger_fraction = 0.0
+        self.shadows = []
+        self._lock = threading.Lock()
+        self._served = {}
+        self._shadowed = {}
+        # (model_version, reference_version) to [compared, agreed]
+        self._agreement = {}
+        self.shadow_dropped = 0
+        self.shadow_errors = 0
+
+    def configure(self, challenger_version=None, challenger_fraction=0.0, shadow_versions=()):
+        """Load and validate the given versions, then replace the current setup"""
+        if not 0.0 <= challenger_fraction <= 1.0:
+            raise ValueError("challenger_fraction must be between 0 and 1")
+        challenger = self.registry.load_version(challenger_version) if challenger_version else None
+        shadows = [self.registry.load_version(version) for version in shadow_versions]
+
+        # Swap references only once everything has loaded
+        self.challenger = challenger
+        self.challenger_fraction = challenger_fraction if challenger is not None else 0.0
+        self.shadows = shadows
+        logger.info(
+            f"Model experiments: challenger {challenger.version if challenger else None} "
+            f"at {self.challenger_fraction:.0%}, shadows {[bundle.version for bundle in shadows]}"
+        )
+
+    def configure_from_env(self):
+        try:
+            self.configure(CHALLENGER_MODEL_VERSION, CHALLENGER_TRAFFIC_FRACTION, SHADOW_MODEL_VERSIONS)
+        except Exception as e:
+            logger.error(f"Error loading experiment models, serving the active model only: {e}")
+
+    def route(self):
+        """Bundle to serve one request with"""
+        challenger = self.challenger
+        if challenger is not None and random.random() < self.challenger_fraction:
+            return challenger
+        return self.registry.active
+
+    def comparisons(self, served):
+        """Bundles to score in the background against the served bundle"""
+        others = [bundle for bundle in self.shadows if bundle.version != served.version]
+        active = self.registry.active
+        if served is not active and all(bundle.version != active.version for bundle in others):
+            others.append(active)
+        return others
+
+    def record_served(self, version, seconds):
+        with self._lock:
+            self._served.setdefault(version, LatencyHistogram()).record(seconds)
+
+    def record_shadow(self, version, reference_version, seconds, prediction, reference):
+        with self._lock:
+            self._shadowed.setdefault(version, LatencyHistogram()).record(seconds)
+            counts = self._agreement.setdefault((version, reference_version), [0, 0])
+            counts[0] += 1
+            counts[1] += prediction == reference
+
+    def record_shadow_dropped(self):
+        with self._lock:
+            self.shadow_dropped += 1
+
+    def record_shadow_error(self):
+        with self._lock:
+            self.shadow_errors += 1
+
+    def stats(self):
+        with self._lock:
+            versions = sorted(set(self._served) | set(self._shadowed))
+            return {
+                "active_version": self.registry.active.version,
+                "challenger_version": self.challenger.version if self.challenger is not None else None,
+                "challenger_fraction": self.challenger_fraction,
+                "shadow_versions": [bundle.version for bundle in self.shadows],
+                "models": {
+                    version: {
+                        "served": self._served[version].to_dict() if version in self._served else None,
+                        "shadow": self._shadowed[version].to_dict() if version in self._shadowed else None,
+                    }
+                    for version in versions
+                },
+                "agreement": [
+                    {
+                        "model_version": version,
+                        "reference_version": reference_version,
+                        "compared": compared,
+                        "agreed": agreed,
+                        "rate": agreed / compared if compared else 0.0,
+                    }
+                    for (version, reference_version), (compared, agreed) in sorted(self._agreement.items())
+                ],
+                "shadow_dropped": self.shadow_dropped,
+                "shadow_errors": self.shadow_errors,
+            }
+
+def score_shadow(experiments, bundle, input_data, reference_version, reference):
+    """Score input_data with bundle and record how it compares; runs on a shadow thread"""
+    started = time.perf_counter()
+    prediction = bundle.predict_one(input_data)
+    experiments.record_shadow(bundle.version, reference_version, time.perf_counter() - started, prediction, reference)
@@ -0,0 +1,248 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from batching import PREDICTION_BATCHING, PREDICTION_MAX_BATCH_SIZE, PredictionCoalescer
+from credit_pipeline import CompiledFeaturePipeline, compile_category_encoders, compile_label_decoder
+from model_artifacts import CURRENT_FILE, MODELS_DIR, load_credit_artifacts, load_native_artifacts
+from tree_engine import CreditModelEngine
+
+logger = logging.getLogger(__name__)
+
+# How often the native artifacts directory is checked for a new CURRENT
+# version; 0 disables watching and leaves reloads to the admin endpoint
+MODEL_WATCH_INTERVAL_SECONDS = float(os.getenv("MODEL_WATCH_INTERVAL_SECONDS", "30"))
+# Rows scored through every prediction path before a model takes traffic
+WARMUP_BATCH_SIZE = int(os.getenv("MODEL_WARMUP_BATCH_SIZE", str(PREDICTION_MAX_BATCH_SIZE)))
+
+class CreditModelBundle:
+    """One credit model version with the encoders and scaler it was trained with
+
+    Never modified once built. Requests take the active bundle once and use it
+    throughout, so a reload never mixes two versions in one prediction.
+    """
+
+    def __init__(self, model, encoders, scaler, version, name=None, run=asyncio.to_thread,
+                 batching=PREDICTION_BATCHING):
+        self.model = model
+        self.scaler = scaler
+        self.version = version
+        # Native artifact directory name, None when loaded from pickles
+        self.name = name
+        self.loaded_at = time.time()
+        # Lookup tables compiled once from the fitted LabelEncoders
+        self.category_encoders = compile_category_encoders(encoders)
+        self.labels = compile_label_decoder(encoders['Credit_Score'])
+        self.feature_pipeline = CompiledFeaturePipeline(scaler, self.category_encoders)
+        self.feature_names = list(self.feature_pipeline.feature_names)
+        # Booster or flattened NumPy evaluator, whichever is faster for the batch
+        self.engine = CreditModelEngine(model)
+        # Rows transformed by this bundle's pipeline must be scored by its own
+        # model, so each bundle batches its own concurrent predictions
+        self.coalescer = PredictionCoalescer(self.predict_rows, run=run) if batching else None
+
+    def encode_frame(self, input_df):
+        """Copy of input_df with Occupation and Type_of_Loan encoded"""
+        encoded = input_df.copy()
+        for column, encoder in self.category_encoders.items():
+            if column in encoded.columns:
+                encoded[column] = encoder.encode(encoded[column])
+        return encoded
+
+    def predict_frame(self, input_df):
+        """Encode, scale and predict every row of input_df in one pass"""
+        df_scaled = self.scaler.transform(self.encode_frame(input_df)[self.feature_names])
+        return self.labels[self.engine.predict(df_scaled)]
+
+    def predict_one(self, input_data):
+        """Predict a single CreditScoreInput without building a DataFrame"""
+        prediction = self.engine.predict(self.feature_pipeline.transform_one(input_data))
+        return self.labels[int(prediction[0])]
+
+    def predict_rows(self, rows):
+        """Predict already encoded and scaled model input rows"""
+        return self.labels[self.engine.predict(rows)]
+
+    def warm_up(self, input_data, batch_size=WARMUP_BATCH_SIZE):
+        """Run input_data through every prediction path so first-call allocations happen now"""
+        self.predict_one(input_data)
+        row = self.feature_pipeline.transform_one(input_data)
+        self.predict_rows(np.repeat(row, batch_size, axis=0))
+        self.predict_frame(pd.DataFrame([input_data.dict()] * batch_size))
+
+class ModelRegistry:
+    """Holds the active CreditModelBundle and swaps in new versions
+
+    New versions are loaded, validated and warmed with a canary prediction on
+    the calling (or watcher) thread while the old bundle keeps serving; only
+    then is the active reference replaced, in a single assignment.
+    """
+
+    def __init__(self, models_dir=MODELS_DIR, watch_interval=MODEL_WATCH_INTERVAL_SECONDS, canary_input=None,
+                 required_features=None, run=asyncio.to_thread):
+        self.models_dir = models_dir
+        self.native_dir = os.path.join(models_dir, 'credit')
+        self.watch_interval = watch_interval
+        # A CreditScoreInput every new version must be able to score
+        self.canary_input = canary_input
+        self.required_features = set(required_features) if required_features is not None else None
+        self.run = run
+        self._active = None
+        # True once the active bundle has been through warm_up
+        self.warmed = False
+        self._reload_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._watch_thread = None
+        # CURRENT name that failed validation, not retried until it changes
+        self._rejected_name = None
+        self.previous_version = None
+        self.reloads = 0
+        self.last_reload_error = None
+
+    @property
+    def active(self):
+        return self._active
+
+    def load(self):
+        """Load the initial bundle: the current native version, else the pickles
+
+        The bundle is validated but not warmed; see warm_up.
+        """
+        model, encoders, scaler, version = load_credit_artifacts(self.models_dir)
+        bundle = CreditModelBundle(model, encoders, scaler, version, name=self._current_name(), run=self.run)
+        self._validate(bundle)
+        self._active = bundle
+        return bundle
+
+    def _current_name(self):
+        try:
+            with open(os.path.join(self.native_dir, CURRENT_FILE)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _resolve_name(self, version):
+        # Accept either the directory name or the bare version
+        if version is None:
+            name = self._current_name()
+            if name is None:
+                raise FileNotFoundError(f"No CURRENT credit model version in {self.native_dir}")
+            return name
+        for name in (version, f"credit-{version}"):
+            if os.path.isdir(os.path.join(self.native_dir, name)):
+                return name
+        raise FileNotFoundError(f"Credit model version {version} not found in {self.native_dir}")
+
+    def _validate(self, bundle):
+        if self.required_features is not None and set(bundle.feature_names) != self.required_features:
+            missing = sorted(self.required_features - set(bundle.feature_names))
+            extra = sorted(set(bundle.feature_names) - self.required_features)
+            raise ValueError(f"Model {bundle.version} features do not match the API: missing {missing}, extra {extra}")
+        if self.canary_input is None:
+            return
+
+        # Warm the model and check both scoring paths agree on a known input
+        label = bundle.predict_one(self.canary_input)
+        if label not in set(bundle.labels.tolist()):
+            raise ValueError(f"Model {bundle.version} predicted unknown label {label!r} for the canary")
+        framed = bundle.predict_frame(pd.DataFrame([self.canary_input.dict()]))[0]
+        if framed != label:
+            raise ValueError(f"Model {bundle.version} canary disagrees between pipelines: {label!r} vs {framed!r}")
+
+    def load_version(self, version=None):
+        """Load, validate and warm a native version without activating it"""
+        name = self._resolve_name(version)
+        model, encoders, scaler, manifest = load_native_artifacts(self.native_dir, name)
+        bundle = CreditModelBundle(model, encoders, scaler, manifest["version"], name=name, run=self.run)
+        self._validate(bundle)
+        if self.canary_input is not None:
+            bundle.warm_up(self.canary_input)
+        return bundle
+
+    def warm_up(self):
+        """Warm the active bundle with a batch of canary inputs"""
+        if self.canary_input is not None and self._active is not None:
+            self._active.warm_up(self.canary_input)
+        self.warmed = self._active is not None
+
+    def reload(self, version=None):
+        """Load, validate and activate a native version, the CURRENT one by default
+
+        Returns the active bundle. On failure the old bundle stays active and
+        the error is raised.
+        """
+        with self._reload_lock:
+            try:
+                name = self._resolve_name(version)
+                active = self._active
+                if active is not None and active.name == name:
+                    return active
+
+                started = time.perf_counter()
+                bundle = self.load_version(name)
+            except Exception as e:
+                self.last_reload_error = str(e)
+                logger.error(f"Credit model reload failed, keeping {self._active.version if self._active else None}: {e}")
+                raise
+
+            self.previous_version = active.version if active is not None else None
+            self._active = bundle
+            self.reloads += 1
+            self.last_reload_error = None
+            self._rejected_name = None
+            logger.info(
+                f"Activated credit model {bundle.version} (was {self.previous_version}) "
+                f"in {time.perf_counter() - started:.3f}s"
+            )
+            return bundle
+
+    def reload_if_changed(self):
+        """Reload when CURRENT points at a version other than the active one"""
+        name = self._current_name()
+        active = self._active
+        if name is None or name == self._rejected_name or (active is not None and active.name == name):
+            return False
+        try:
+            self.reload(name)
+        except Exception:
+            self._rejected_name = name
+            return False
+        return True
+
+    def start_watching(self):
+        """Start the daemon thread that activates new CURRENT versions"""
+        if self._watch_thread is not None or self.watch_interval <= 0:
+            return
+
+        self._stop_event.clear()
+        self._watch_thread = threading.Thread(target=self._watch_loop, name="model-watch", daemon=True)
+        self._watch_thread.start()
+        logger.info(f"Watching {self.native_dir} for new credit models every {self.watch_interval:g} seconds")
+
+    def stop_watching(self):
+        self._stop_event.set()
+        if self._watch_thread is not None:
+            self._watch_thread.join()
+        self._watch_thread = None
+
+    def _watch_loop(self):
+        while not self._stop_event.wait(self.watch_interval):
+            self.reload_if_changed()
+
+    def status(self):
+        active = self._active
+        return {
+            "model_version": active.version if active is not None else None,
+            "name": active.name if active is not None else None,
+            "loaded_at": active.loaded_at if active is not None else None,
+            "previous_version": self.previous_version,
+            "reloads": self.reloads,
+            "last_reload_error": self.last_reload_error,
+            "watch_interval_seconds": self.watch_interval,
+            "inference_engine": active.engine.status() if active is not None else None,
+        }
@@ -0,0 +1,113 @@
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import text
+
+from similarity import partition_neighbours
+
+logger = logging.getLogger(__name__)
+
+# Number of neighbours kept per house; requests asking for more fall back to live scoring
+NEIGHBOUR_TOP_K = int(os.getenv("NEIGHBOUR_TABLE_TOP_K", "20"))
+NEIGHBOUR_BLOCK_SIZE = int(os.getenv("NEIGHBOUR_TABLE_BLOCK_SIZE", "1024"))
+NEIGHBOUR_WORKERS = int(os.getenv("NEIGHBOUR_TABLE_WORKERS", str(os.cpu_count() or 1)))
+
+class NeighbourTable:
+    """Precomputed top-k similar houses for every house of one catalog snapshot"""
+
+    def __init__(self, snapshot_version, top_k, neighbours, computed_at):
+        self.snapshot_version = snapshot_version
+        self.top_k = top_k
+        # houses.index to the houses.index of its neighbours, most similar first
+        self.neighbours = neighbours
+        self.computed_at = computed_at
+
+    def __len__(self):
+        return len(self.neighbours)
+
+    def lookup(self, house_index, top_n):
+        return self.neighbours.get(house_index, [])[:top_n]
+
+def _partition_tasks(snapshot, block_size):
+    # Split large partitions into several tasks so one big location does not
+    # end up on a single worker
+    rows_per_task = block_size * 4
+    for partition in snapshot.partitions.values():
+        for start in range(0, len(partition), rows_per_task):
+            yield partition.matrix, partition.indices, start, min(start + rows_per_task, len(partition))
+
+def _run_task(task, top_k, block_size):
+    matrix, indices, start, stop = task
+    return partition_neighbours(matrix, indices, top_k, start, stop, block_size)
+
+def compute_neighbour_table(snapshot, top_k=NEIGHBOUR_TOP_K, workers=NEIGHBOUR_WORKERS, block_size=NEIGHBOUR_BLOCK_SIZE):
+    """Compute the top-k neighbours of every house in the snapshot"""
+    started = time.perf_counter()
+    tasks = list(_partition_tasks(snapshot, block_size))
+    neighbours = {}
+
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_run_task, task, top_k, block_size) for task in tasks]
+            for future in futures:
+                for house_index, similar in future.result().items():
+                    neighbours.setdefault(house_index, similar)
+    else:
+        for task in tasks:
+            for house_index, similar in _run_task(task, top_k, block_size).items():
+                neighbours.setdefault(house_index, similar)
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"Computed top-{top_k} neighbours for {len(neighbours)} houses in {elapsed:.2f}s using {workers} workers")
+    return NeighbourTable(snapshot.version, top_k, neighbours, time.time())
+
+def save_neighbour_table(table, engine):
+    """Replace the contents of house_similarities with the table"""
+    rows = [
+        {"house_index": house_index, "similar_indexes": similar}
+        for house_index, similar in table.neighbours.items()
+    ]
+    with engine.begin() as connection:
+        connection.execute(text("DELETE FROM house_similarities"))
+        if rows:
+            connection.execute(
+                text("""
+                INSERT INTO house_similarities (house_index, similar_indexes, computed_at)
+                VALUES (:house_index, :similar_indexes, NOW())
+                """),
+                rows,
+            )
+    logger.info(f"Saved {len(rows)} rows to house_similarities")
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute similar houses for the whole catalog")
+    parser.add_argument("--top-k", type=int, default=NEIGHBOUR_TOP_K)
+    parser.add_argument("--workers", type=int, default=NEIGHBOUR_WORKERS)
+    parser.add_argument("--block-size", type=int, default=NEIGHBOUR_BLOCK_SIZE)
+    parser.add_argument("--save", action="store_true", help="write the result to the house_similarities table")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    )
+
+    from similar_houses import recommender
+
+    # Load the catalog only: no background refresh or listener threads, and
+    # no table computed (or saved) by initialize() itself under
+    # NEIGHBOUR_TABLE_ENABLED, since this job computes it once below
+    recommender.neighbour_table_enabled = False
+    recommender.initialize(start_background=False)
+    if recommender.df.empty:
+        raise SystemExit("No houses loaded, check DATABASE_URL")
+
+    table = compute_neighbour_table(recommender.snapshot, args.top_k, args.workers, args.block_size)
+    if args.save:
+        save_neighbour_table(table, recommender.engine)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+
+# 0 disables the cache
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "10000"))
+PREDICTION_CACHE_TTL_SECONDS = float(os.getenv("PREDICTION_CACHE_TTL_SECONDS", "300"))
+
+class PredictionCache:
+    """LRU cache of predictions keyed by the model input row
+
+    Entries expire ttl_seconds after they were computed. Concurrent misses for
+    the same key are single-flighted: the first caller computes, the others
+    await its result. Like PredictionCoalescer, all bookkeeping happens on the
+    event loop, so no locks are needed.
+    """
+
+    def __init__(self, max_size=PREDICTION_CACHE_SIZE, ttl_seconds=PREDICTION_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        # key to (expires_at, prediction), least recently used first
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def make_key(row, model_version):
+        """Key for an encoded and scaled model input row under model_version
+
+        The row is the exact float32 vector the model sees, so inputs that
+        only differ before encoding (e.g. 2 and 2.0) share an entry.
+        """
+        digest = hashlib.blake2b(row.tobytes(), digest_size=16).hexdigest()
+        return f"{model_version}:{digest}"
+
+    async def get_or_compute(self, key, compute):
+        """Cached prediction for key, or the result of awaiting compute()"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self._entries[key]
+            self.expirations += 1
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            # A task of its own, so a cancelled first caller does not cancel
+            # the computation the others are waiting for
+            task = asyncio.ensure_future(compute())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._store(key, done))
+        return await asyncio.shield(task)
+
+    def _store(self, key, task):
+        self._in_flight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, task.result())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
@@ -0,0 +1,166 @@
+import argparse
+import io
+import logging
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+
+from core_banking import DEFAULT_OCCUPATION, FEATURE_COLUMNS
+from model_artifacts import load_credit_artifacts
+from model_registry import CreditModelBundle
+
+logger = logging.getLogger(__name__)
+
+RESCORE_CHUNK_SIZE = int(os.getenv("RESCORE_CHUNK_SIZE", "5000"))
+
+# Every users row with a core banking profile, streamed through a server-side
+# cursor so only one chunk is held in memory at a time
+RESCORE_QUERY = f"""
+SELECT
+    u.id AS user_id,
+    {', '.join(f'cb.{column}' for column in FEATURE_COLUMNS)}
+FROM
+    users u
+JOIN
+    core_banking_users cb ON cb.phone_number = u.phone_number
+"""
+
+class ChunkScorer:
+    """Score a DataFrame of core_banking_users columns with one model call"""
+
+    def __init__(self, bundle):
+        self.bundle = bundle
+
+    def score(self, chunk):
+        """(user ids, predicted labels) of the rows that can be scored
+
+        Rows with a missing feature are left out, as the single-row endpoint
+        would reject them.
+        """
+        feature_names = self.bundle.feature_names
+        features = chunk.rename(columns=FEATURE_COLUMNS)
+        features['Occupation'] = features['Occupation'].fillna(DEFAULT_OCCUPATION)
+        complete = features[feature_names].notna().all(axis=1).to_numpy()
+        features = features.loc[complete, feature_names]
+        if features.empty:
+            return np.empty(0, dtype=object), np.empty(0, dtype=object)
+        return chunk['user_id'].to_numpy()[complete], self.bundle.predict_frame(features.astype({
+            column: np.float64 for column in feature_names if column not in self.bundle.category_encoders
+        }))
+
+def load_profile_risk_ids(connection):
+    """profile_risks.name to id, matching how UserService stores predictions"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT id, name FROM profile_risks")
+        return {name: risk_id for risk_id, name in cursor.fetchall()}
+
+def write_profile_risks(connection, user_ids, profile_risk_ids):
+    """COPY one chunk into the staging table and apply it with a single UPDATE"""
+    buffer = io.StringIO()
+    pd.DataFrame({"user_id": user_ids, "profile_risk_id": profile_risk_ids}).to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+
+    with connection.cursor() as cursor:
+        cursor.copy_expert("COPY profile_risk_updates (user_id, profile_risk_id) FROM STDIN WITH (FORMAT csv)", buffer)
+        cursor.execute("""
+        UPDATE users u
+        SET profile_risk_id = t.profile_risk_id
+        FROM profile_risk_updates t
+        WHERE u.id = t.user_id
+            AND u.profile_risk_id IS DISTINCT FROM t.profile_risk_id
+        """)
+        updated = cursor.rowcount
+    # Each chunk commits on its own, which also empties the staging table
+    connection.commit()
+    return updated
+
+def rescore_users(database_url, scorer, chunk_size=RESCORE_CHUNK_SIZE, dry_run=False):
+    """Recompute users.profile_risk_id for every user with a core banking profile"""
+    engine = create_engine(database_url)
+    # Raw DBAPI connections, for the named cursor and COPY
+    reader = engine.raw_connection()
+    writer = engine.raw_connection()
+    totals = {"read": 0, "scored": 0, "updated": 0, "skipped": 0}
+    started = time.perf_counter()
+
+    try:
+        profile_risk_ids = load_profile_risk_ids(writer)
+        with writer.cursor() as cursor:
+            cursor.execute("""
+            CREATE TEMP TABLE profile_risk_updates (
+                user_id TEXT PRIMARY KEY,
+                profile_risk_id INTEGER NOT NULL
+            ) ON COMMIT DELETE ROWS
+            """)
+        writer.commit()
+
+        # A named cursor is a server-side cursor in psycopg2
+        with reader.cursor(name="rescore_users") as cursor:
+            cursor.itersize = chunk_size
+            cursor.execute(RESCORE_QUERY)
+            columns = None
+
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                if columns is None:
+                    columns = [column.name for column in cursor.description]
+
+                chunk = pd.DataFrame.from_records(rows, columns=columns)
+                user_ids, labels = scorer.score(chunk)
+                risk_ids = pd.Series(labels, dtype=object).map(profile_risk_ids)
+                known = risk_ids.notna().to_numpy()
+                if not known.all():
+                    unknown = sorted(set(labels[~known]))
+                    logger.warning(f"No profile_risks row named {unknown}, leaving those users unchanged")
+
+                totals["read"] += len(chunk)
+                totals["scored"] += int(known.sum())
+                totals["skipped"] += len(chunk) - int(known.sum())
+                if not dry_run and known.any():
+                    totals["updated"] += write_profile_risks(
+                        writer, user_ids[known], risk_ids[known].astype(np.int64).to_numpy()
+                    )
+
+                elapsed = time.perf_counter() - started
+                logger.info(f"Rescored {totals['read']} users, {totals['read'] / elapsed:.0f} rows/s")
+    finally:
+        reader.close()
+        writer.close()
+        engine.dispose()
+
+    elapsed = time.perf_counter() - started
+    totals["seconds"] = elapsed
+    totals["rows_per_second"] = totals["read"] / elapsed if elapsed else 0.0
+    logger.info(
+        f"Rescoring done: {totals['read']} read, {totals['scored']} scored, {totals['updated']} updated, "
+        f"{totals['skipped']} skipped in {elapsed:.1f}s ({totals['rows_per_second']:.0f} rows/s)"
+    )
+    return totals
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute users.profile_risk_id for every core banking user")
+    parser.add_argument("--chunk-size", type=int, default=RESCORE_CHUNK_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="score every user without writing profile_risk_id")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    )
+
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        raise SystemExit("DATABASE_URL not found in environment variables")
+
+    model, encoders, scaler, version = load_credit_artifacts()
+    logger.info(f"Rescoring with credit model {version}")
+    scorer = ChunkScorer(CreditModelBundle(model, encoders, scaler, version, batching=False))
+    rescore_users(database_url, scorer, args.chunk_size, args.dry_run)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+import argparse
+import gc
+import importlib
+import logging
+import os
+import select
+import signal
+import socket
+import time
+
+import uvicorn
+from threadpoolctl import threadpool_limits
+
+logger = logging.getLogger(__name__)
+
+# Production entrypoint: the master imports main, loads the credit models and
+# the house catalog once, then forks uvicorn workers that share the loaded
+# data copy-on-write and accept connections from one listening socket.
+#
+#   SIGHUP           refresh the master's models and catalog, then replace the
+#                    workers one at a time (rolling restart)
+#   SIGTERM, SIGINT  stop the workers gracefully and exit
+
+CPU_COUNT = os.cpu_count() or 1
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "5000"))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", str(CPU_COUNT)))
+# OpenMP (XGBoost) and BLAS threads per worker; 0 splits the cores evenly
+WORKER_THREADS = int(os.getenv("WORKER_THREADS", "0"))
+WORKER_START_TIMEOUT_SECONDS = float(os.getenv("WORKER_START_TIMEOUT_SECONDS", "60"))
+# How long a stopping worker may spend finishing in-flight requests
+WORKER_GRACEFUL_TIMEOUT_SECONDS = float(os.getenv("WORKER_GRACEFUL_TIMEOUT_SECONDS", "30"))
+LISTEN_BACKLOG = int(os.getenv("LISTEN_BACKLOG", "2048"))
+
+# Read by the native libraries when they are first loaded
+THREAD_ENV_VARS = ["OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"]
+
+def bind_socket(host, port, backlog=LISTEN_BACKLOG):
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+def start_worker_server(service, sock, ready_fd, threads, graceful_timeout):
+    """Serve service.app on sock in this (forked) process until told to stop"""
+
+    class WorkerServer(uvicorn.Server):
+        async def startup(self, sockets=None):
+            await super().startup(sockets=sockets)
+            # Tell the master this worker is taking connections
+            if not self.should_exit:
+                os.write(ready_fd, b"1")
+            os.close(ready_fd)
+
+    threadpool_limits(limits=threads)
+    config = uvicorn.Config(
+        service.app,
+        lifespan="on",
+        log_config=None,
+        timeout_graceful_shutdown=graceful_timeout,
+    )
+    WorkerServer(config).run(sockets=[sock])
+
+class PreforkMaster:
+    """Forks and supervises uvicorn workers from a process that has loaded everything
+
+    Workers inherit the preloaded models and catalog instead of loading their
+    own. One that dies is replaced. A rolling restart starts each replacement
+    and waits until it accepts connections before stopping the worker it
+    replaces, so capacity never drops.
+    """
+
+    def __init__(self, service, sock, n_workers=WEB_CONCURRENCY, threads=1,
+                 start_timeout=WORKER_START_TIMEOUT_SECONDS, graceful_timeout=WORKER_GRACEFUL_TIMEOUT_SECONDS):
+        self.service = service
+        self.sock = sock
+        self.n_workers = n_workers
+        self.threads = threads
+        self.start_timeout = start_timeout
+        self.graceful_timeout = graceful_timeout
+        # pid to start time
+        self.workers = {}
+        self._stopping = False
+        self._restart_requested = False
+
+    def spawn(self):
+        """Fork a worker; returns (pid, fd that becomes readable once it has started)
+
+        Wait for one worker before spawning the next: a child forked in
+        between would hold the pipe open and hide the first one's exit.
+        """
+        read_fd, write_fd = os.pipe()
+        # Everything loaded so far is moved out of the collector's reach, so
+        # collections in the workers do not write to (and copy) those pages
+        gc.freeze()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            # uvicorn installs its own handlers; until then behave like a
+            # plain process
+            for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+                signal.signal(signum, signal.SIG_DFL)
+            exit_code = 1
+            try:
+                start_worker_server(self.service, self.sock, write_fd, self.threads, self.graceful_timeout)
+                exit_code = 0
+            except SystemExit as e:
+                exit_code = e.code if isinstance(e.code, int) else 1
+            except BaseException:
+                logger.exception("Worker crashed")
+            finally:
+                os._exit(exit_code)
+
+        os.close(write_fd)
+        self.workers[pid] = time.monotonic()
+        return pid, read_fd
+
+    def wait_started(self, pid, ready_fd):
+        """True once the worker has started; False if it exited or timed out first"""
+        try:
+            readable, _, _ = select.select([ready_fd], [], [], self.start_timeout)
+            started = bool(readable) and os.read(ready_fd, 1) == b"1"
+        finally:
+            os.close(ready_fd)
+        if not started:
+            logger.error(f"Worker {pid} did not start within {self.start_timeout:g}s")
+        return started
+
+    def stop_worker(self, pid, timeout=None):
+        """SIGTERM pid and wait for it to exit, killing it after timeout"""
+        timeout = self.graceful_timeout + 5 if timeout is None else timeout
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                done, _ = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if done:
+                break
+            if time.monotonic() > deadline:
+                logger.warning(f"Worker {pid} still running after {timeout:g}s, killing it")
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+                break
+            time.sleep(0.1)
+        self.workers.pop(pid, None)
+
+    def stop_all(self):
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        # Workers stop in parallel; each one gets whatever is left of the timeout
+        deadline = time.monotonic() + self.graceful_timeout + 5
+        for pid in list(self.workers):
+            self.stop_worker(pid, timeout=max(0.0, deadline - time.monotonic()))
+
+    def rolling_restart(self):
+        """Refresh the preloaded state, then replace the workers one by one"""
+        logger.info("Rolling restart: refreshing models and catalog")
+        with threadpool_limits(limits=1):
+            self.service.refresh_preloaded()
+        for old_pid in list(self.workers):
+            if self._stopping:
+                return
+            pid, ready_fd = self.spawn()
+            if not self.wait_started(pid, ready_fd):
+                self.stop_worker(pid, timeout=5)
+                logger.error("Rolling restart aborted, the remaining workers keep serving")
+                return
+            self.stop_worker(old_pid)
+            logger.info(f"Replaced worker {old_pid} with {pid}")
+        logger.info("Rolling restart done")
+
+    def reap(self):
+        """Replace workers that exited on their own"""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            started_at = self.workers.pop(pid, None)
+            if started_at is None or self._stopping:
+                continue
+            logger.warning(f"Worker {pid} exited with code {os.waitstatus_to_exitcode(status)}, starting a replacement")
+            if time.monotonic() - started_at < self.start_timeout:
+                # Do not spin if workers die as soon as they start
+                time.sleep(1)
+            self.wait_started(*self.spawn())
+
+    def _handle_stop(self, signum, frame):
+        self._stopping = True
+
+    def _handle_restart(self, signum, frame):
+        self._restart_requested = True
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGHUP, self._handle_restart)
+
+        for _ in range(self.n_workers):
+            if not self.wait_started(*self.spawn()):
+                self.stop_all()
+                raise SystemExit("Workers failed to start")
+        logger.info(f"Serving with {self.n_workers} workers, {self.threads} threads each")
+
+        while not self._stopping:
+            if self._restart_requested:
+                self._restart_requested = False
+                self.rolling_restart()
+            self.reap()
+            time.sleep(0.5)
+
+        logger.info("Stopping workers")
+        self.stop_all()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the ML API with preloaded, forked workers")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=WEB_CONCURRENCY)
+    parser.add_argument("--threads", type=int, default=WORKER_THREADS, help="per worker; 0 splits the cores evenly")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    )
+
+    threads = args.threads or max(1, CPU_COUNT // args.workers)
+    for name in THREAD_ENV_VARS:
+        os.environ.setdefault(name, str(threads))
+
+    # Imported only now so the thread settings apply to its native libraries
+    service = importlib.import_module("main")
+
+    # No OpenMP or BLAS thread pools may exist when forking: GNU OpenMP's
+    # would be unusable in the workers. Workers raise the limit again.
+    with threadpool_limits(limits=1):
+        service.preload()
+    sock = bind_socket(args.host, args.port)
+    logger.info(f"Preloaded in {time.time() - service.startup_report.started_at:.3f}s, listening on {args.host}:{args.port}")
+
+    PreforkMaster(service, sock, n_workers=args.workers, threads=threads).run()
+
+if __name__ == "__main__":
+    main()
@@ -1,146 +1,812 @@
+import numpy as np
 import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.preprocessing import StandardScaler
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 import os
+import copy
+import itertools
+import json
+import select
+import threading
+import time
 from dotenv import load_dotenv
 import logging
+from ann import RandomProjectionLSH
+import snapshot_store
+from similarity import rank_similar
 
 # Load environment variables
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# How often the background thread pulls changed houses from the database
+REFRESH_INTERVAL_SECONDS = float(os.getenv("CATALOG_REFRESH_INTERVAL_SECONDS", "300"))
+# How often the incremental refresh is replaced by a full reload, which is the
+# only way to notice rows that were hard-deleted from the houses table
+FULL_RESYNC_INTERVAL_SECONDS = float(os.getenv("CATALOG_FULL_RESYNC_INTERVAL_SECONDS", "3600"))
+
+# Sync strategy after the initial load: "poll" fetches changed rows every
+# refresh interval, "notify" applies rows pushed by the houses_changed trigger
+SYNC_MODE = os.getenv("CATALOG_SYNC_MODE", "poll").lower()
+NOTIFY_CHANNEL = os.getenv("CATALOG_NOTIFY_CHANNEL", "houses_changed")
+
+NUMERIC_FEATURES = ['price', 'room_count', 'bathroom_count', 'parking_count', 'land_area', 'building_area']
+
+# Keep a precomputed top-k neighbour table for the whole catalog, recomputed by
+# the refresh thread whenever the catalog changes
+NEIGHBOUR_TABLE_ENABLED = os.getenv("NEIGHBOUR_TABLE_ENABLED", "false").lower() == "true"
+# Also write the table to house_similarities so other services can read it
+NEIGHBOUR_TABLE_SAVE = os.getenv("NEIGHBOUR_TABLE_SAVE", "false").lower() == "true"
+
+# Directory for memory-mapped catalog snapshots shared by all workers on the
+# host; empty disables them
+SNAPSHOT_DIR = os.getenv("CATALOG_SNAPSHOT_DIR", "")
+
+# "exact" scores every house of the location; "lsh" queries an approximate
+# random-projection index for locations of at least ANN_MIN_PARTITION_SIZE houses
+SIMILARITY_BACKEND = os.getenv("SIMILARITY_BACKEND", "exact").lower()
+ANN_MIN_PARTITION_SIZE = int(os.getenv("ANN_MIN_PARTITION_SIZE", "200000"))
+ANN_TABLES = int(os.getenv("ANN_TABLES", "8"))
+ANN_BITS = int(os.getenv("ANN_BITS", "20"))
+ANN_PROBE_RADIUS = int(os.getenv("ANN_PROBE_RADIUS", "0"))
+
+_snapshot_versions = itertools.count(1)
+
+HOUSE_COLUMNS = [
+    'id',
+    'index',
+    'title',
+    'price',
+    'location',
+    'room_count',
+    'bathroom_count',
+    'parking_count',
+    'land_area',
+    'building_area',
+    'image_url',
+    'is_sold',
+    'updated_at',
+]
+
+def apply_house_changes(df, changes):
+    """Return a copy of df with changed houses upserted and sold houses dropped"""
+    changes = changes.drop_duplicates('id', keep='last')
+    remaining = df[~df['id'].isin(changes['id'])] if not df.empty else df
+    listed = changes[~changes['is_sold'].astype(bool)]
+    if remaining.empty:
+        return listed.reset_index(drop=True)
+    if listed.empty:
+        return remaining.reset_index(drop=True)
+    return pd.concat([remaining, listed], ignore_index=True)
+
+def _timestamps_ns(values):
+    """Timestamps as int64 UTC nanoseconds, whether tz-aware or naive"""
+    timestamps = pd.DatetimeIndex(values)
+    if timestamps.tz is not None:
+        timestamps = timestamps.tz_convert(None)
+    return timestamps.as_unit('ns').asi8
+
+def drop_applied_changes(snapshot, changes):
+    """Rows of changes that snapshot does not already reflect
+
+    The incremental fetch re-reads the rows sharing the watermark timestamp.
+    A listed house already in the snapshot with the same updated_at, or a sold
+    house already gone from it, is no change at all.
+    """
+    if changes.empty:
+        return changes
+    positions = changes['id'].map(snapshot.positions_by_id)
+    present = positions.notna().to_numpy()
+    sold = changes['is_sold'].astype(bool).to_numpy()
+    unchanged = np.zeros(len(changes), dtype=bool)
+    if present.any():
+        current = _timestamps_ns(snapshot.df['updated_at'].to_numpy()[positions[present].astype(np.int64)])
+        unchanged[present] = current == _timestamps_ns(changes['updated_at'][present])
+    applied = (sold & ~present) | (~sold & unchanged)
+    return changes[~applied]
+
+class LocationPartition:
+    """Contiguous block of the feature matrix holding every house in one location"""
+
+    def __init__(self, matrix, indices, offset):
+        # Scaled, L2-normalized float32 features, one row per house
+        self.matrix = matrix
+        # houses.index of each row
+        self.indices = indices
+        # Row position of the first house of the partition within the snapshot
+        self.offset = offset
+
+    def __len__(self):
+        return len(self.indices)
+
+def build_feature_index(df, scaler, features=None, indices=None, partition_bounds=None):
+    """Scale and normalize the features of a location-sorted catalog once
+
+    Returns the float32 feature matrix and a dict of location to partition, so
+    cosine similarity against a partition is a single matrix-vector product.
+    An already built matrix (e.g. memory-mapped from disk) can be passed as
+    features, with the houses.index array and [location, start, stop]
+    partition bounds to use as they are instead of deriving them from df.
+    """
+    if scaler is None or df.empty:
+        return np.empty((0, len(NUMERIC_FEATURES)), dtype=np.float32), {}
+
+    if features is None:
+        scaled = scaler.transform(df[NUMERIC_FEATURES])
+        norms = np.linalg.norm(scaled, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        features = np.ascontiguousarray(scaled / norms, dtype=np.float32)
+    if indices is None:
+        indices = df['index'].to_numpy(dtype=np.int64)
+    if partition_bounds is None:
+        # Rows are sorted by location, so every location is a single run of rows
+        locations = df['location'].to_numpy()
+        boundaries = np.flatnonzero(locations[1:] != locations[:-1]) + 1
+        starts = np.concatenate(([0], boundaries))
+        stops = np.concatenate((boundaries, [len(df)]))
+        partition_bounds = zip(locations[starts], starts, stops)
+
+    partitions = {}
+    for location, start, stop in partition_bounds:
+        partitions[location] = LocationPartition(features[start:stop], indices[start:stop], int(start))
+    return features, partitions
+
+def build_position_map(keys):
+    """Map each key to the first row position holding it"""
+    positions = {}
+    for position, key in enumerate(keys.tolist()):
+        positions.setdefault(key, position)
+    return positions
+
+def _column_array(df, column):
+    if df.empty:
+        return np.empty(0, dtype=np.int64)
+    return df[column].to_numpy(dtype=np.int64)
+
+class CatalogSnapshot:
+    """Immutable view of the unsold houses catalog that requests are served from"""
+
+    def __init__(self, df, scaler, loaded_at, watermark=None, full_synced_at=None, features=None, ids=None,
+                 indices=None, partition_bounds=None):
+        # A precomputed features matrix implies df is already sorted to match
+        # it; ids, indices and partition_bounds, when given, describe the same rows
+        if scaler is not None and not df.empty and features is None:
+            df = df.sort_values('location', kind='stable').reset_index(drop=True)
+        self.df = df
+        self.scaler = scaler
+        # Changes whenever the catalog contents change, but not on touched()
+        self.version = next(_snapshot_versions)
+        # houses.id and houses.index of each row
+        self.ids = ids if ids is not None else _column_array(df, 'id')
+        self.indices = indices if indices is not None else _column_array(df, 'index')
+        self.features, self.partitions = build_feature_index(df, scaler, features, self.indices, partition_bounds)
+        # houses.index and houses.id to row position; built with the rest of the
+        # snapshot so lookups always agree with the features they point at
+        self.positions_by_index = build_position_map(self.indices)
+        self.positions_by_id = build_position_map(self.ids)
+        self.loaded_at = loaded_at
+        # Latest houses.updated_at seen, the lower bound of the next incremental fetch
+        self.watermark = watermark
+        self.full_synced_at = full_synced_at
+
+    @classmethod
+    def empty(cls):
+        return cls(pd.DataFrame(), None, None)
+
+    def touched(self, loaded_at, full_synced_at=None):
+        """Same catalog, confirmed up to date at loaded_at"""
+        snapshot = copy.copy(self)
+        snapshot.loaded_at = loaded_at
+        if full_synced_at is not None:
+            snapshot.full_synced_at = full_synced_at
+        return snapshot
+
+    def find_position(self, house_index=None, house_id=None):
+        """Row position of a house by its index or id, or None if not in the catalog"""
+        if house_id is not None:
+            return self.positions_by_id.get(house_id)
+        return self.positions_by_index.get(house_index)
+
+    @property
+    def age_seconds(self):
+        if self.loaded_at is None:
+            return None
+        return time.time() - self.loaded_at
+
 class SimilarHousesRecommender:
-    def __init__(self):
+    def __init__(self, refresh_interval=REFRESH_INTERVAL_SECONDS, full_resync_interval=FULL_RESYNC_INTERVAL_SECONDS, sync_mode=SYNC_MODE,
+                 neighbour_table_enabled=NEIGHBOUR_TABLE_ENABLED, similarity_backend=SIMILARITY_BACKEND,
+                 snapshot_dir=SNAPSHOT_DIR):
         self.engine = None
-        self.df = pd.DataFrame()
-        self.scaler = None
-        self.numeric_features = ['price', 'room_count', 'bathroom_count', 'parking_count', 'land_area', 'building_area']
-        self.initialize()
-        
-    def initialize(self):
-        """Initialize database connection and load data"""
+        self.snapshot = CatalogSnapshot.empty()
+        self.numeric_features = NUMERIC_FEATURES
+        self.refresh_interval = refresh_interval
+        self.full_resync_interval = full_resync_interval
+        self.sync_mode = sync_mode
+        self.notifications_applied = 0
+        self.neighbour_table_enabled = neighbour_table_enabled
+        self.neighbour_table = None
+        # Whether this process computes (and saves) the neighbour table; forked
+        # workers leave that to the process that forked them
+        self.neighbour_table_owner = True
+        self.similarity_backend = similarity_backend
+        self.ann_index = None
+        self.snapshot_dir = snapshot_dir
+        self.last_refresh_error = None
+        self._refresh_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._refresh_thread = None
+        self._listen_thread = None
+
+    @property
+    def df(self):
+        return self.snapshot.df
+
+    @property
+    def scaler(self):
+        return self.snapshot.scaler
+
+    def initialize(self, start_background=True):
+        """Initialize database connection, load data and start the background refresh
+
+        With start_background False nothing is left running, so the process
+        can fork; each child then calls after_fork.
+        """
         try:
+            # Start from the on-disk snapshot when there is one; the background
+            # refresh then only has to catch up on changes since its watermark
+            from_disk = self.snapshot_dir and self.load_snapshot_from_disk()
+
             # Create database connection
             DATABASE_URL = os.getenv("DATABASE_URL")
             if not DATABASE_URL:
                 logger.warning("DATABASE_URL not found in environment variables")
                 return
-                
+
             self.engine = create_engine(DATABASE_URL)
-            
+
             # Load initial data
-            self.refresh_data()
-            
-            # Initialize scaler
+            if not from_disk:
+                self.refresh_data(full=True)
+
             if not self.df.empty:
-                self.scaler = StandardScaler()
-                self.scaler.fit(self.df[self.numeric_features])
                 logger.info(f"Successfully initialized SimilarHousesRecommender with {len(self.df)} houses")
             else:
                 logger.warning("No data loaded from database")
+
+            if self.neighbour_table_enabled:
+                self.refresh_neighbour_table()
+
+            if start_background:
+                self.start_background_sync(catch_up=bool(from_disk))
         except Exception as e:
             logger.error(f"Error initializing SimilarHousesRecommender: {e}")
-    
-    def refresh_data(self):
-        """Refresh house data from database"""
+
+    def refresh_data(self, full=None):
+        """Refresh house data from database and swap in a new snapshot
+
+        Only rows changed since the snapshot watermark are fetched, unless a
+        full resync is requested or due (to pick up hard-deleted houses).
+        """
         if not self.engine:
             logger.warning("Database engine not initialized")
             return
-            
+
+        with self._refresh_lock:
+            try:
+                snapshot = self.snapshot
+                if full is None:
+                    full = self._full_resync_due(snapshot)
+
+                if full:
+                    new_snapshot = self._load_full(snapshot)
+                else:
+                    new_snapshot = self._load_changes(snapshot)
+
+                # Requests hold a reference to the snapshot they started with,
+                # so replacing it here never exposes a half-built catalog
+                self.snapshot = new_snapshot
+                self.last_refresh_error = None
+
+                if full and self.snapshot_dir and new_snapshot.version != snapshot.version:
+                    self.save_snapshot_to_disk(new_snapshot)
+
+            except Exception as e:
+                self.last_refresh_error = str(e)
+                logger.error(f"Error loading data from database: {e}")
+                return
+
+        self._catalog_updated()
+
+    def _full_resync_due(self, snapshot):
+        if snapshot.full_synced_at is None or snapshot.watermark is None:
+            return True
+        return time.time() - snapshot.full_synced_at >= self.full_resync_interval
+
+    def _load_full(self, snapshot):
+        query = f"""
+        SELECT {', '.join(HOUSE_COLUMNS)}
+        FROM
+            houses
+        WHERE
+            is_sold = FALSE
+        """
+
+        df = pd.read_sql(query, self.engine)
+        logger.info(f"Loaded {len(df)} houses from database")
+
+        # Debug: Log unique locations
+        locations = df['location'].unique()
+        logger.info(f"Available locations: {', '.join(locations)}")
+
+        now = time.time()
+        # Same houses at the same updated_at: keep the snapshot, so the scaler,
+        # ANN index and neighbour table built for it stay valid
+        if snapshot.loaded_at is not None and len(df) == len(snapshot.df) and drop_applied_changes(snapshot, df).empty:
+            return snapshot.touched(now, full_synced_at=now)
+
+        new_snapshot = CatalogSnapshot(
+            df,
+            self._fit_scaler(df),
+            loaded_at=now,
+            watermark=self._max_updated_at(df, None),
+            full_synced_at=now,
+        )
+        self._sync_ann_index(new_snapshot)
+        return new_snapshot
+
+    def _load_changes(self, snapshot):
+        # ">=" re-reads rows sharing the watermark timestamp; upserts are idempotent
+        query = text(f"""
+        SELECT {', '.join(HOUSE_COLUMNS)}
+        FROM
+            houses
+        WHERE
+            updated_at >= :watermark
+        """)
+
+        changes = drop_applied_changes(
+            snapshot, pd.read_sql(query, self.engine, params={"watermark": snapshot.watermark})
+        )
+        now = time.time()
+
+        # Nothing new: keep the snapshot (and everything derived from its
+        # version) and only record that it is up to date
+        if changes.empty:
+            return snapshot.touched(now)
+
+        df = apply_house_changes(snapshot.df, changes)
+        sold_count = int(changes['is_sold'].sum())
+        logger.info(f"Applied {len(changes) - sold_count} upserts and {sold_count} removals, catalog now has {len(df)} houses")
+
+        scaler = snapshot.scaler if snapshot.scaler is not None else self._fit_scaler(df)
+        new_snapshot = CatalogSnapshot(
+            df,
+            scaler,
+            loaded_at=now,
+            watermark=self._max_updated_at(changes, snapshot.watermark),
+            full_synced_at=snapshot.full_synced_at,
+        )
+        self._sync_ann_index(new_snapshot, changes, rebuild=snapshot.scaler is None)
+        return new_snapshot
+
+    def _sync_ann_index(self, snapshot, changes=None, rebuild=True):
+        """Bring the ANN index in line with snapshot
+
+        Full loads (and scaler changes) rebuild it; otherwise only the changed
+        houses are inserted, replaced or deleted.
+        """
+        if self.similarity_backend != "lsh":
+            return
+
+        df = snapshot.df
+        if rebuild or changes is None or self.ann_index is None:
+            index = RandomProjectionLSH(len(NUMERIC_FEATURES), ANN_TABLES, ANN_BITS, ANN_PROBE_RADIUS)
+            if not df.empty:
+                index.add(df['id'].tolist(), df['index'].tolist(), df['location'].tolist(), snapshot.features)
+            self.ann_index = index
+            logger.info(f"Built ANN index with {len(index)} houses")
+            return
+
+        changed_ids = changes['id'].unique().tolist()
+        listed = [snapshot.positions_by_id[house_id] for house_id in changed_ids if house_id in snapshot.positions_by_id]
+        removed = [house_id for house_id in changed_ids if house_id not in snapshot.positions_by_id]
+        self.ann_index.remove(removed)
+        if listed:
+            self.ann_index.add(
+                df['id'].iloc[listed].tolist(),
+                df['index'].iloc[listed].tolist(),
+                df['location'].iloc[listed].tolist(),
+                snapshot.features[listed],
+            )
+
+    def _use_ann(self, partition):
+        return (
+            self.similarity_backend == "lsh"
+            and self.ann_index is not None
+            and len(partition) >= ANN_MIN_PARTITION_SIZE
+        )
+
+    def _fit_scaler(self, df):
+        if df.empty:
+            return None
+        scaler = StandardScaler()
+        scaler.fit(df[self.numeric_features])
+        return scaler
+
+    @staticmethod
+    def _max_updated_at(df, default):
+        if df.empty:
+            return default
+        latest = df['updated_at'].max()
+        if default is not None and default > latest:
+            return default
+        return latest
+
+    def load_snapshot_from_disk(self):
+        """Serve the current on-disk snapshot; returns False if there is none"""
+        try:
+            loaded = snapshot_store.load_snapshot(self.snapshot_dir)
+            if loaded is None:
+                return False
+
+            df, scaler, arrays, manifest = loaded
+            watermark = pd.Timestamp(manifest["watermark"]) if manifest["watermark"] else None
+            # The mapped arrays are used as they are, so the workers on the
+            # host share them instead of copying them onto their heaps
+            snapshot = CatalogSnapshot(
+                df,
+                scaler,
+                loaded_at=manifest["loaded_at"],
+                watermark=watermark,
+                full_synced_at=manifest["full_synced_at"],
+                features=arrays["features"],
+                ids=arrays["ids"],
+                indices=arrays["indices"],
+                partition_bounds=manifest["partitions"],
+            )
+            with self._refresh_lock:
+                self._sync_ann_index(snapshot)
+                self.snapshot = snapshot
+            return True
+        except Exception as e:
+            logger.error(f"Error loading catalog snapshot from {self.snapshot_dir}: {e}")
+            return False
+
+    def save_snapshot_to_disk(self, snapshot):
+        if snapshot.df.empty:
+            return
+        try:
+            snapshot_store.save_snapshot(snapshot, self.snapshot_dir, NUMERIC_FEATURES)
+        except Exception as e:
+            logger.error(f"Error saving catalog snapshot to {self.snapshot_dir}: {e}")
+
+    def start_background_sync(self, catch_up=False):
+        """Start the background refresh, and the notification listener in notify mode"""
+        self.start_background_refresh(catch_up=catch_up)
+        if self.sync_mode == "notify":
+            self.start_listening()
+
+    def after_fork(self):
+        """Take over a recommender initialized in the parent of a forked process
+
+        Pooled connections are shared with the parent, so they are dropped
+        without closing them; the inherited snapshot may be older than the
+        database, so the refresh catches up straight away. The parent stays
+        the only process computing and saving the neighbour table: this one
+        serves the inherited table until its own catalog changes, then scores
+        live.
+        """
+        self.neighbour_table_owner = False
+        if self.engine is None:
+            return
+        self.engine.dispose(close=False)
+        self.start_background_sync(catch_up=True)
+
+    def start_background_refresh(self, catch_up=False):
+        """Start the daemon thread that periodically refreshes the catalog
+
+        With catch_up, the first refresh runs immediately instead of after one
+        interval, e.g. after starting from an on-disk snapshot.
+        """
+        if self._refresh_thread is not None or self._refresh_period() <= 0:
+            return
+
+        self._stop_event.clear()
+        self._refresh_thread = threading.Thread(
+            target=self._refresh_loop, args=(catch_up,), name="catalog-refresh", daemon=True
+        )
+        self._refresh_thread.start()
+        logger.info(f"Catalog refresh scheduled every {self._refresh_period():g} seconds")
+
+    def stop_background_refresh(self):
+        """Stop the background refresh and notification listener threads"""
+        self._stop_event.set()
+        for thread in (self._refresh_thread, self._listen_thread):
+            if thread is not None:
+                thread.join()
+        self._refresh_thread = None
+        self._listen_thread = None
+
+    def _refresh_period(self):
+        # With notifications pushing row changes, polling is only needed for the
+        # periodic full resync
+        if self.sync_mode == "notify":
+            return self.full_resync_interval
+        return self.refresh_interval
+
+    def _refresh_loop(self, catch_up=False):
+        if catch_up:
+            self.refresh_data()
+        while not self._stop_event.wait(self._refresh_period()):
+            self.refresh_data(full=True if self.sync_mode == "notify" else None)
+
+    def _catalog_updated(self):
+        # After every refresh or applied notification; the table is only
+        # recomputed when the snapshot version actually changed
+        if self.neighbour_table_enabled and self.neighbour_table_owner:
+            self.refresh_neighbour_table()
+
+    def refresh_neighbour_table(self):
+        """Recompute the neighbour table if the catalog changed since the last run"""
+        from neighbour_table import compute_neighbour_table, save_neighbour_table
+
+        snapshot = self.snapshot
+        table = self.neighbour_table
+        if snapshot.df.empty or (table is not None and table.snapshot_version == snapshot.version):
+            return
+
         try:
-            query = """
-            SELECT 
-                id,
-                index,
-                title, 
-                price, 
-                location,
-                room_count, 
-                bathroom_count, 
-                parking_count, 
-                land_area, 
-                building_area,
-                image_url,
-                is_sold
-            FROM 
-                houses
-            WHERE
-                is_sold = FALSE
-            """
-            
-            self.df = pd.read_sql(query, self.engine)
-            logger.info(f"Loaded {len(self.df)} houses from database")
-            
-            # Debug: Log unique locations
-            locations = self.df['location'].unique()
-            logger.info(f"Available locations: {', '.join(locations)}")
-            
+            table = compute_neighbour_table(snapshot)
+            self.neighbour_table = table
+            if NEIGHBOUR_TABLE_SAVE and self.engine is not None:
+                save_neighbour_table(table, self.engine)
         except Exception as e:
-            logger.error(f"Error loading data from database: {e}")
-            
-    def get_similar_houses(self, house_index, top_n=5):
-        """Get similar houses based on a house index"""
-        # Refresh data to get latest
-        self.refresh_data()
-        
-        if self.df.empty:
+            logger.error(f"Error computing neighbour table: {e}", exc_info=True)
+
+    def start_listening(self):
+        """Start the daemon thread that applies houses_changed notifications"""
+        if self._listen_thread is not None:
+            return
+
+        self._stop_event.clear()
+        self._listen_thread = threading.Thread(
+            target=self._listen_loop, name="catalog-listen", daemon=True
+        )
+        self._listen_thread.start()
+        logger.info(f"Listening for catalog changes on channel {NOTIFY_CHANNEL}")
+
+    def _listen_loop(self):
+        retry_delay = 1
+        while not self._stop_event.is_set():
+            connection = None
+            try:
+                # A dedicated connection, detached from the pool, since it stays
+                # in LISTEN state for the lifetime of the thread
+                pooled = self.engine.raw_connection()
+                pooled.detach()
+                connection = pooled.driver_connection
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{NOTIFY_CHANNEL}"')
+
+                # Catch up on anything committed while we were not listening
+                self.refresh_data()
+                retry_delay = 1
+
+                while not self._stop_event.is_set():
+                    if select.select([connection], [], [], 1.0) == ([], [], []):
+                        continue
+                    connection.poll()
+                    payloads = []
+                    while connection.notifies:
+                        payloads.append(connection.notifies.pop(0).payload)
+                    if payloads:
+                        self.apply_notifications(payloads)
+
+            except Exception as e:
+                self.last_refresh_error = str(e)
+                logger.error(f"Catalog listener failed, reconnecting in {retry_delay}s: {e}")
+                self._stop_event.wait(retry_delay)
+                retry_delay = min(retry_delay * 2, 60)
+            finally:
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+
+    def apply_notifications(self, payloads):
+        """Apply houses_changed notification payloads to the current snapshot"""
+        rows = []
+        for payload in payloads:
+            message = json.loads(payload)
+            row = message['row']
+            # Deleted houses are removed from the catalog just like sold ones
+            if message['op'] == 'DELETE':
+                row['is_sold'] = True
+            rows.append(row)
+
+        changes = pd.DataFrame(rows, columns=HOUSE_COLUMNS)
+        changes['updated_at'] = pd.to_datetime(changes['updated_at'], format='ISO8601')
+
+        with self._refresh_lock:
+            snapshot = self.snapshot
+            df = apply_house_changes(snapshot.df, changes)
+            scaler = snapshot.scaler if snapshot.scaler is not None else self._fit_scaler(df)
+            new_snapshot = CatalogSnapshot(
+                df,
+                scaler,
+                loaded_at=time.time(),
+                watermark=self._max_updated_at(changes, snapshot.watermark),
+                full_synced_at=snapshot.full_synced_at,
+            )
+            self._sync_ann_index(new_snapshot, changes, rebuild=snapshot.scaler is None)
+            self.snapshot = new_snapshot
+            self.notifications_applied += len(rows)
+
+        logger.info(f"Applied {len(rows)} catalog notifications, catalog now has {len(df)} houses")
+        self._catalog_updated()
+
+    def status(self):
+        """Describe the currently served snapshot for monitoring"""
+        snapshot = self.snapshot
+        return {
+            "loaded": snapshot.loaded_at is not None,
+            "row_count": len(snapshot.df),
+            "loaded_at": snapshot.loaded_at,
+            "age_seconds": snapshot.age_seconds,
+            "refresh_interval_seconds": self.refresh_interval,
+            "sync_mode": self.sync_mode,
+            "notifications_applied": self.notifications_applied,
+            "full_synced_at": snapshot.full_synced_at,
+            "watermark": snapshot.watermark.isoformat() if snapshot.watermark is not None else None,
+            "last_refresh_error": self.last_refresh_error,
+            "neighbour_table_current": self._neighbour_table_for(snapshot) is not None,
+            "similarity_backend": self.similarity_backend,
+        }
+
+    def _neighbour_table_for(self, snapshot, top_n=0):
+        table = self.neighbour_table
+        if table is None or table.snapshot_version != snapshot.version or top_n > table.top_k:
+            return None
+        return table
+
+    def get_similar_houses(self, house_index=None, top_n=5, house_id=None):
+        """Get similar houses based on a house index or id"""
+        # Serve from the current snapshot; the background thread keeps it fresh
+        snapshot = self.snapshot
+        df = snapshot.df
+
+        if df.empty:
             logger.warning("No house data available")
             return []
-            
+
         try:
-            # Find the house with the given index
-            clicked_property = self.df[self.df['index'] == house_index]
-            
-            if clicked_property.empty:
-                logger.warning(f"No house found with index {house_index}")
+            # Find the house with the given index or id
+            position = snapshot.find_position(house_index=house_index, house_id=house_id)
+
+            if position is None:
+                if house_id is not None:
+                    logger.warning(f"No house found with id {house_id}")
+                else:
+                    logger.warning(f"No house found with index {house_index}")
                 return []
-            
-            clicked_property = clicked_property.iloc[0]
-            
+
+            house_index = int(df['index'].iat[position])
+
+            # Precomputed for this exact snapshot, so identical to scoring live
+            table = self._neighbour_table_for(snapshot, top_n)
+            if table is not None:
+                return table.lookup(house_index, top_n)
+
+            clicked_location = df['location'].iat[position]
+
             # Debug: Log the clicked property details
-            logger.info(f"Finding similar houses for index {house_index}, location: {clicked_property['location']}")
-            
+            logger.info(f"Finding similar houses for index {house_index}, location: {clicked_location}")
+
             # Apply strict location filter
-            clicked_location = clicked_property['location']
-            filtered_df = self.df[self.df['location'] == clicked_location]
-            
+            partition = snapshot.partitions[clicked_location]
+
             # Log how many houses we have in the same location
-            logger.info(f"Found {len(filtered_df)} houses in location: {clicked_location}")
-            
-            # Remove the selected house
-            filtered_df = filtered_df[filtered_df['index'] != house_index]
-            
-            if filtered_df.empty:
+            logger.info(f"Found {len(partition)} houses in location: {clicked_location}")
+
+            # Check if we have enough houses for comparison
+            candidate_count = int((partition.indices != house_index).sum())
+            if candidate_count == 0:
                 logger.info(f"No other houses found in location: {clicked_location}")
                 return []
-            
-            # Check if we have enough houses for comparison
-            if len(filtered_df) < top_n:
-                logger.info(f"Only {len(filtered_df)} houses available in {clicked_location}, fewer than requested {top_n}")
-                
-            # Scale features
-            filtered_features = self.scaler.transform(filtered_df[self.numeric_features])
-            clicked_property_features = self.scaler.transform([clicked_property[self.numeric_features]])
-            
-            # Calculate similarity
-            similarities = cosine_similarity(clicked_property_features, filtered_features)
-            filtered_df['similarity_score'] = similarities[0]
-            
-            # Get top similar houses
-            top_similar = filtered_df.sort_values('similarity_score', ascending=False).head(top_n)
-            
+            if candidate_count < top_n:
+                logger.info(f"Only {candidate_count} houses available in {clicked_location}, fewer than requested {top_n}")
+
+            similar_indices = None
+            if self._use_ann(partition):
+                similar_indices = self.ann_index.query(
+                    snapshot.features[position], clicked_location, top_n, exclude_value=house_index
+                )
+                # Too few houses shared a bucket with the anchor; score exactly instead
+                if len(similar_indices) < min(top_n, candidate_count):
+                    similar_indices = None
+
+            if similar_indices is None:
+                # Rows are pre-scaled and normalized, so this is the cosine similarity
+                vector = snapshot.features[position]
+                scores = partition.matrix @ vector
+
+                # Get top similar houses
+                similar_indices = rank_similar(partition.matrix, partition.indices, scores, vector, house_index, top_n)
+
             # Log the results
-            similar_indices = top_similar['index'].tolist()
             logger.info(f"Returning {len(similar_indices)} similar houses with indices: {similar_indices}")
-            
+
             # Return indices
             return similar_indices
-            
+
         except Exception as e:
             logger.error(f"Error finding similar houses: {e}", exc_info=True)
             return []
 
-# Create a singleton instance
-recommender = SimilarHousesRecommender()
\ No newline at end of file
+    def get_similar_houses_batch(self, house_indexes=None, top_n=5, house_ids=None):
+        """Get similar houses for many anchors, keyed by the given index or id
+
+        Anchors are grouped by location so each partition is scored with one
+        matrix-matrix product. Unknown anchors map to an empty list.
+        """
+        by_id = house_ids is not None
+        anchors = house_ids if by_id else house_indexes
+        results = {anchor: [] for anchor in anchors}
+
+        snapshot = self.snapshot
+        df = snapshot.df
+        if df.empty:
+            logger.warning("No house data available")
+            return results
+
+        try:
+            grouped = {}
+            for anchor in results:
+                if by_id:
+                    position = snapshot.find_position(house_id=anchor)
+                else:
+                    position = snapshot.find_position(house_index=anchor)
+                if position is None:
+                    logger.warning(f"No house found with {'id' if by_id else 'index'} {anchor}")
+                    continue
+                grouped.setdefault(df['location'].iat[position], []).append((anchor, position))
+
+            for location, members in grouped.items():
+                partition = snapshot.partitions[location]
+                if self._use_ann(partition):
+                    exact_members = []
+                    for anchor, position in members:
+                        house_index = int(df['index'].iat[position])
+                        similar = self.ann_index.query(
+                            snapshot.features[position], location, top_n, exclude_value=house_index
+                        )
+                        if len(similar) < min(top_n, len(partition) - 1):
+                            exact_members.append((anchor, position))
+                        else:
+                            results[anchor] = similar
+                    members = exact_members
+                    if not members:
+                        continue
+
+                positions = [position for _, position in members]
+                # One column of similarities per anchor
+                scores = partition.matrix @ snapshot.features[positions].T
+                for column, (anchor, position) in enumerate(members):
+                    house_index = int(df['index'].iat[position])
+                    results[anchor] = rank_similar(
+                        partition.matrix, partition.indices, scores[:, column], snapshot.features[position], house_index, top_n
+                    )
+
+            logger.info(f"Returning similar houses for {len(grouped)} locations and {len(results)} anchors")
+            return results
+
+        except Exception as e:
+            logger.error(f"Error finding similar houses: {e}", exc_info=True)
+            return results
+
+# Shared instance; nothing is loaded until initialize() is called
+recommender = SimilarHousesRecommender()
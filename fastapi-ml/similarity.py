@@ -0,0 +1,81 @@
+import numpy as np
+
+# Pure NumPy similarity helpers. Kept free of database and model side effects
+# so process pool workers can import them cheaply.
+
+# Similarities are compared on this grid, far coarser than float64 rounding
+# error, so houses with identical features tie exactly whichever BLAS kernel or
+# row position produced their scores, and the houses.index tie-break decides
+SIMILARITY_DECIMALS = 9
+# Bound on how far a float32 similarity of unit vectors with a few features can
+# be from the float64 one, with a wide margin. Partitions are scanned in
+# float32; only houses this close to the k-th score are rescored exactly.
+CANDIDATE_TOLERANCE = 1e-5
+
+def cosine_similarities(matrix, vectors):
+    """matrix @ vectors in float64, rounded to SIMILARITY_DECIMALS
+
+    Rows of matrix and vectors are already scaled and L2-normalized, so this is
+    the cosine similarity. float32 products carry ~1e-7 of position-dependent
+    rounding, enough to order true ties at random. Converts its inputs, so it
+    is meant for candidate rows, not whole partitions.
+    """
+    similarities = np.asarray(matrix, dtype=np.float64) @ np.asarray(vectors, dtype=np.float64)
+    return np.round(similarities, SIMILARITY_DECIMALS, out=similarities)
+
+def select_top_k(scores, keys, k):
+    """Positions of the k highest scores, best first, ties broken by smaller key
+
+    Uses a partial selection, so the cost is linear in len(scores) plus a sort
+    of the k selected entries rather than a sort of the whole partition.
+    """
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+
+    if k < len(scores):
+        threshold = scores[np.argpartition(scores, len(scores) - k)[len(scores) - k]]
+        # Keep every score tied with the threshold so the tie-break sees all of them
+        selected = np.flatnonzero(scores >= threshold)
+    else:
+        selected = np.arange(len(scores))
+
+    order = np.lexsort((keys[selected], -scores[selected]))[:k]
+    return selected[order]
+
+def rank_similar(matrix, indices, scores, vector, house_index, top_n):
+    """houses.index of the top_n rows of matrix most similar to vector, excluding the anchor itself
+
+    scores are the float32 similarities matrix @ vector; they only narrow the
+    partition down to the houses within CANDIDATE_TOLERANCE of the top_n-th
+    score, which are rescored with cosine_similarities before ranking. scores
+    is overwritten for the excluded rows.
+    """
+    candidates = indices != house_index
+    candidate_count = int(candidates.sum())
+    if candidate_count == 0:
+        return []
+    scores[~candidates] = -np.inf
+    k = min(top_n, candidate_count)
+    threshold = scores[np.argpartition(scores, len(scores) - k)[len(scores) - k]]
+    rescored = np.flatnonzero(scores >= threshold - CANDIDATE_TOLERANCE)
+    similarities = cosine_similarities(matrix[rescored], vector)
+    order = select_top_k(similarities, indices[rescored], k)
+    return indices[rescored[order]].tolist()
+
+def partition_neighbours(matrix, indices, top_k, start=0, stop=None, block_size=1024):
+    """Top-k neighbours for rows start:stop of one location partition
+
+    Similarities are computed block_size rows at a time so memory stays at
+    block_size x len(partition) floats. Returns {house index: [house index, ...]}.
+    """
+    stop = len(indices) if stop is None else stop
+    neighbours = {}
+    for block_start in range(start, stop, block_size):
+        block_stop = min(block_start + block_size, stop)
+        scores = matrix[block_start:block_stop] @ matrix.T
+        for row, position in enumerate(range(block_start, block_stop)):
+            house_index = int(indices[position])
+            if house_index not in neighbours:
+                neighbours[house_index] = rank_similar(matrix, indices, scores[row], matrix[position], house_index, top_k)
+    return neighbours
@@ -0,0 +1,133 @@
+import json
+import logging
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+
+logger = logging.getLogger(__name__)
+
+# On-disk catalog snapshots. Each version is a directory of .npy arrays plus a
+# manifest; CURRENT names the version to load. Arrays are opened with
+# mmap_mode='r', so every worker on the host shares one copy through the page
+# cache and starts without touching the database.
+
+FORMAT_VERSION = 1
+CURRENT_FILE = "CURRENT"
+# Older versions may still be mapped by running workers; unlinking them is safe
+# on POSIX, but keep the previous one around for workers that are mid-load
+KEEP_VERSIONS = 2
+
+def save_snapshot(snapshot, directory, numeric_features):
+    """Write snapshot as a new version under directory and make it current"""
+    df = snapshot.df
+    os.makedirs(directory, exist_ok=True)
+    name = f"snapshot-{int(time.time() * 1000)}-{os.getpid()}"
+    staging = os.path.join(directory, f".{name}.tmp")
+    os.makedirs(staging)
+
+    try:
+        partitions = [
+            [location, partition.offset, partition.offset + len(partition)]
+            for location, partition in snapshot.partitions.items()
+        ]
+        scaler = snapshot.scaler
+        np.save(os.path.join(staging, "features.npy"), snapshot.features)
+        np.save(os.path.join(staging, "numeric.npy"), df[numeric_features].to_numpy(dtype=np.float64))
+        np.save(os.path.join(staging, "ids.npy"), df['id'].to_numpy(dtype=np.int64))
+        np.save(os.path.join(staging, "indices.npy"), df['index'].to_numpy(dtype=np.int64))
+        np.save(os.path.join(staging, "updated_at.npy"), df['updated_at'].to_numpy(dtype="datetime64[ns]"))
+        np.save(os.path.join(staging, "scaler_mean.npy"), scaler.mean_)
+        np.save(os.path.join(staging, "scaler_scale.npy"), scaler.scale_)
+        np.save(os.path.join(staging, "scaler_var.npy"), scaler.var_)
+
+        manifest = {
+            "format_version": FORMAT_VERSION,
+            "created_at": time.time(),
+            "loaded_at": snapshot.loaded_at,
+            "full_synced_at": snapshot.full_synced_at,
+            "watermark": snapshot.watermark.isoformat() if snapshot.watermark is not None else None,
+            "row_count": len(df),
+            "numeric_features": list(numeric_features),
+            "scaler_n_samples_seen": int(scaler.n_samples_seen_),
+            "partitions": partitions,
+        }
+        with open(os.path.join(staging, "manifest.json"), "w") as f:
+            json.dump(manifest, f)
+
+        os.rename(staging, os.path.join(directory, name))
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    # Atomically repoint CURRENT so readers see either the old or the new version
+    pointer = os.path.join(directory, f".{CURRENT_FILE}.{os.getpid()}")
+    with open(pointer, "w") as f:
+        f.write(name)
+    os.replace(pointer, os.path.join(directory, CURRENT_FILE))
+
+    _prune_versions(directory)
+    logger.info(f"Saved catalog snapshot {name} with {len(df)} houses")
+    return name
+
+def _prune_versions(directory):
+    versions = sorted(
+        entry for entry in os.listdir(directory)
+        if entry.startswith("snapshot-")
+    )
+    for stale in versions[:-KEEP_VERSIONS]:
+        shutil.rmtree(os.path.join(directory, stale), ignore_errors=True)
+
+def load_snapshot(directory):
+    """Memory-map the current snapshot version
+
+    Returns (df, scaler, arrays, manifest), or None if no snapshot exists.
+    df holds only the columns the recommender needs; arrays maps "features",
+    "ids" and "indices" to the mapped arrays. Only the location and is_sold
+    columns live on the heap, every other column is a view of a mapped file.
+    """
+    try:
+        with open(os.path.join(directory, CURRENT_FILE)) as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return None
+
+    path = os.path.join(directory, name)
+    with open(os.path.join(path, "manifest.json")) as f:
+        manifest = json.load(f)
+    if manifest["format_version"] != FORMAT_VERSION:
+        logger.warning(f"Ignoring catalog snapshot {name} with format {manifest['format_version']}")
+        return None
+
+    def load(array_name):
+        return np.load(os.path.join(path, f"{array_name}.npy"), mmap_mode='r')
+
+    numeric_features = manifest["numeric_features"]
+    arrays = {array_name: load(array_name) for array_name in ("features", "ids", "indices")}
+    numeric = load("numeric")
+    locations = np.empty(manifest["row_count"], dtype=object)
+    for location, start, stop in manifest["partitions"]:
+        locations[start:stop] = location
+
+    columns = {'id': arrays["ids"], 'index': arrays["indices"]}
+    columns.update((feature, numeric[:, i]) for i, feature in enumerate(numeric_features))
+    columns['location'] = locations
+    columns['is_sold'] = np.zeros(manifest["row_count"], dtype=bool)
+    columns['updated_at'] = load("updated_at")
+    # copy=False keeps one block per column instead of consolidating them
+    # into fresh arrays
+    df = pd.DataFrame(columns, copy=False)
+
+    scaler = StandardScaler()
+    scaler.mean_ = np.asarray(load("scaler_mean"))
+    scaler.scale_ = np.asarray(load("scaler_scale"))
+    scaler.var_ = np.asarray(load("scaler_var"))
+    scaler.n_features_in_ = len(numeric_features)
+    scaler.feature_names_in_ = np.asarray(numeric_features, dtype=object)
+    scaler.n_samples_seen_ = manifest["scaler_n_samples_seen"]
+
+    logger.info(f"Mapped catalog snapshot {name} with {manifest['row_count']} houses")
+    return df, scaler, arrays, manifest
@@ -0,0 +1,48 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+class StartupReport:
+    """Wall-clock time of each startup phase, in the order they finished"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.phases = {}
+        # Phases that failed, with their error
+        self.errors = {}
+        self.ready_seconds = None
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds, error=None):
+        with self._lock:
+            self.phases[name] = seconds
+            if error is not None:
+                self.errors[name] = error
+        logger.info(f"Startup phase {name} took {seconds:.3f}s" + (f" and failed: {error}" if error else ""))
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.record(name, time.perf_counter() - started, error=str(e))
+            raise
+        self.record(name, time.perf_counter() - started)
+
+    def mark_ready(self):
+        self.ready_seconds = time.time() - self.started_at
+        summary = ", ".join(f"{name} {seconds:.3f}s" for name, seconds in self.phases.items())
+        logger.info(f"Ready to serve after {self.ready_seconds:.3f}s ({summary})")
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "started_at": self.started_at,
+                "ready_seconds": self.ready_seconds,
+                "phases": dict(self.phases),
+                "errors": dict(self.errors),
+            }
@@ -93,5 +93,74 @@ async def test_predict_endpoint():
         print("\nHealth Check Status Code:", health_response.status_code)
         pprint(health_response.json())
 
+def test_by_phone_uses_model_experiments():
+    """By-phone scoring is routed, recorded and shadowed like /api/predict/profile-risk
+
+    Runs in process against the local models, with the core banking lookup
+    stubbed and every request routed to a challenger.
+    """
+    import copy
+    import time
+    from fastapi.testclient import TestClient
+    import main
+    from core_banking import FEATURE_COLUMNS
+
+    profile = {
+        "Age": 35,
+        "Occupation": "Teacher",
+        "Annual_Income": 45000,
+        "Monthly_Inhand_Salary": 3000,
+        "Num_Bank_Accounts": 1,
+        "Num_Credit_Card": 1,
+        "Interest_Rate": 12,
+        "Num_of_Loan": 3,
+        "Type_of_Loan": "Personal Loan",
+        "Delay_from_due_date": 15,
+        "Num_of_Delayed_Payment": 3,
+        "Changed_Credit_Limit": 5,
+        "Num_Credit_Inquiries": 4,
+        "Credit_Mix": 1,
+        "Outstanding_Debt": 3000,
+        "Credit_History_Age": 48,
+        "Payment_of_Min_Amount": 1,
+        "Total_EMI_per_month": 450,
+        "Payment_Behaviour": 1,
+        "Monthly_Balance": 600
+    }
+    row = {column: profile[feature] for column, feature in FEATURE_COLUMNS.items()}
+    row["updated_at"] = "2025-01-01T00:00:00"
+
+    with TestClient(main.app) as client:
+        experiments = main.model_experiments
+        active = main.model_registry.active
+        # The active model under another version, so the cache and the
+        # statistics tell the two apart
+        challenger = copy.copy(active)
+        challenger.version = "by-phone-challenger"
+        main.core_banking.fetch_by_phone = lambda phone_number: row
+        experiments.challenger, experiments.challenger_fraction = challenger, 1.0
+        try:
+            response = client.post("/api/predict/profile-risk/by-phone", json={"phone_number": "+998900000000"})
+            assert response.status_code == 200, response.text
+            assert response.json()["model_version"] == challenger.version
+
+            # The active model scores the same row in the background
+            deadline = time.monotonic() + 5
+            while time.monotonic() < deadline:
+                stats = experiments.stats()
+                if stats["models"].get(active.version, {}).get("shadow"):
+                    break
+                time.sleep(0.05)
+            assert stats["models"][challenger.version]["served"]["count"] == 1
+            assert stats["models"][active.version]["shadow"]["count"] == 1
+            assert [(entry["model_version"], entry["reference_version"], entry["agreed"]) for entry in stats["agreement"]] == [
+                (active.version, challenger.version, 1)
+            ]
+        finally:
+            experiments.challenger, experiments.challenger_fraction = None, 0.0
+            del main.core_banking.fetch_by_phone
+    print("By-phone experiment routing OK")
+
 if __name__ == "__main__":
-    asyncio.run(test_predict_endpoint())
\ No newline at end of file
+    asyncio.run(test_predict_endpoint())
+    test_by_phone_uses_model_experiments()
\ No newline at end of file
@@ -0,0 +1,266 @@
+import json
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Which engine scores credit model rows: "xgboost" always calls the booster,
+# "numpy" always uses the flattened evaluator, "auto" uses the evaluator for
+# batches of at most NUMPY_ENGINE_MAX_BATCH_SIZE rows (see
+# benchmarks/tree_engine.py) and the booster for larger ones
+CREDIT_INFERENCE_ENGINE = os.getenv("CREDIT_INFERENCE_ENGINE", "auto").lower()
+NUMPY_ENGINE_MAX_BATCH_SIZE = int(os.getenv("NUMPY_ENGINE_MAX_BATCH_SIZE", "16"))
+# Rows evaluated at once; bounds the (rows, trees) working arrays
+NUMPY_ENGINE_CHUNK_ROWS = int(os.getenv("NUMPY_ENGINE_CHUNK_ROWS", "1024"))
+# Random scaled rows compared against the booster before the evaluator is used
+NUMPY_ENGINE_PARITY_ROWS = int(os.getenv("NUMPY_ENGINE_PARITY_ROWS", "4096"))
+
+ENGINES = ("auto", "xgboost", "numpy")
+SUPPORTED_OBJECTIVES = ("binary:logistic", "multi:softprob", "multi:softmax")
+
+class TreeEnsemble:
+    """A gbtree classifier flattened into contiguous node arrays
+
+    Every node of every tree lives in one set of arrays: split feature,
+    threshold, left child, default direction for missing values and leaf
+    value. Nodes are numbered breadth first with each right child stored
+    right after its left sibling, so the right child is left + 1. A leaf has
+    a NaN threshold, which no value passes, and left = leaf - 1: it steps
+    "right" onto itself. A batch is therefore evaluated level by level with
+    a few gathers per level and no per-tree Python loop; after max_depth
+    levels every row sits on a leaf of every tree. The leaves are then added
+    to the base margin like XGBoost does, one tree at a time in float32, so
+    the margins are bit-identical to the booster's.
+    """
+
+    def __init__(self, feature, threshold, left, default_left, value, roots, tree_group, base_margin, max_depth,
+                 n_features, objective):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.default_left = default_left
+        self.value = value
+        self.roots = roots
+        self.max_depth = max_depth
+        self.n_features = n_features
+        self.objective = objective
+        self.base_margin = base_margin
+        # Trees of each output group, in boosting order
+        self.group_trees = [np.flatnonzero(tree_group == group) for group in range(len(base_margin))]
+
+    @classmethod
+    def from_model(cls, model):
+        """Flatten a fitted XGBClassifier, honouring its best_iteration"""
+        booster = model.get_booster()
+        best_iteration = getattr(model, "best_iteration", None)
+        n_rounds = best_iteration + 1 if best_iteration is not None else None
+        return cls.from_booster(booster, n_rounds)
+
+    @classmethod
+    def from_booster(cls, booster, n_rounds=None):
+        """Flatten the trees of an xgboost Booster, the first n_rounds rounds only if given"""
+        learner = json.loads(bytes(booster.save_raw(raw_format="json")))["learner"]
+        objective = learner["objective"]["name"]
+        if objective not in SUPPORTED_OBJECTIVES:
+            raise ValueError(f"Unsupported objective {objective}")
+        gradient_booster = learner["gradient_booster"]
+        if gradient_booster["name"] != "gbtree":
+            raise ValueError(f"Unsupported booster {gradient_booster['name']}")
+
+        model = gradient_booster["model"]
+        trees = model["trees"]
+        tree_group = np.asarray(model["tree_info"], dtype=np.intp)
+        if n_rounds is not None:
+            n_trees = int(model["iteration_indptr"][n_rounds])
+            trees, tree_group = trees[:n_trees], tree_group[:n_trees]
+
+        params = learner["learner_model_param"]
+        n_features = int(params["num_feature"])
+        base_score = np.atleast_1d(np.asarray(json.loads(params["base_score"]), dtype=np.float32))
+        if objective == "binary:logistic":
+            # Stored as a probability; trees add to its log-odds, which XGBoost
+            # computes as -logf(1 / p - 1) in float32. logf is correctly rounded,
+            # NumPy's float32 log not always, hence the float64 log rounded once.
+            odds = np.float32(1) / base_score - np.float32(1)
+            base_margin = (-np.log(odds.astype(np.float64))).astype(np.float32)
+        else:
+            base_margin = np.broadcast_to(base_score, (int(params["num_class"]),))
+
+        features, thresholds, lefts, defaults, values, roots = [], [], [], [], [], []
+        max_depth = 0
+        offset = 0
+        for tree in trees:
+            if int(tree["tree_param"]["size_leaf_vector"]) > 1:
+                raise ValueError("Multi-target trees are not supported")
+            if any(tree["split_type"]):
+                raise ValueError("Categorical splits are not supported")
+            feature, threshold, left, default_left, value, depth = _flatten_tree(tree)
+            features.append(feature)
+            thresholds.append(threshold)
+            lefts.append(left + offset)
+            defaults.append(default_left)
+            values.append(value)
+            roots.append(offset)
+            max_depth = max(max_depth, depth)
+            offset += len(feature)
+
+        return cls(
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds),
+            left=np.concatenate(lefts),
+            default_left=np.concatenate(defaults),
+            value=np.concatenate(values),
+            roots=np.asarray(roots, dtype=np.intp),
+            tree_group=tree_group,
+            base_margin=np.asarray(base_margin, dtype=np.float32),
+            max_depth=max_depth,
+            n_features=n_features,
+            objective=objective,
+        )
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def margins(self, X, chunk_rows=NUMPY_ENGINE_CHUNK_ROWS):
+        """(rows, groups) raw scores for X, as output_margin=True would give"""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected rows of {self.n_features} features, got shape {X.shape}")
+        out = np.empty((len(X), len(self.base_margin)), dtype=np.float32)
+        for start in range(0, len(X), chunk_rows):
+            out[start:start + chunk_rows] = self._margins(X[start:start + chunk_rows])
+        return out
+
+    def _margins(self, X):
+        n_rows = len(X)
+        flat = X.ravel()
+        # Offset of each row in the flattened input, broadcast over trees
+        row_offsets = (np.arange(n_rows, dtype=np.intp) * self.n_features)[:, None]
+        nodes = np.repeat(self.roots[None, :], n_rows, axis=0)
+        has_missing = bool(np.isnan(flat).any())
+
+        for _ in range(self.max_depth):
+            x = flat[row_offsets + self.feature[nodes]]
+            # XGBoost sends x < threshold left, compared in float32
+            go_left = x < self.threshold[nodes]
+            if has_missing:
+                missing = np.isnan(x)
+                go_left[missing] = self.default_left[nodes[missing]]
+            nodes = self.left[nodes] + ~go_left
+
+        leaves = self.value[nodes]
+        out = np.empty((n_rows, len(self.base_margin)), dtype=np.float32)
+        for group, trees in enumerate(self.group_trees):
+            # add.accumulate sums strictly left to right, as XGBoost does per row
+            terms = np.empty((n_rows, len(trees) + 1), dtype=np.float32)
+            terms[:, 0] = self.base_margin[group]
+            terms[:, 1:] = leaves[:, trees]
+            out[:, group] = np.add.accumulate(terms, axis=1)[:, -1]
+        return out
+
+    def predict(self, X):
+        """Class indices, like XGBClassifier.predict"""
+        margins = self.margins(X)
+        if self.objective == "binary:logistic":
+            # Thresholded as a float32 probability, like the booster; the margin's
+            # sign can disagree with it for margins within rounding of 0
+            probabilities = np.float32(1) / (np.float32(1) + np.exp(-margins[:, 0]))
+            return (probabilities > 0.5).astype(np.intp)
+        return margins.argmax(axis=1)
+
+def _flatten_tree(tree):
+    """Node arrays of one tree renumbered breadth first, and its depth"""
+    left = tree["left_children"]
+    right = tree["right_children"]
+    # Reachable old node ids in their new order; children are appended in
+    # pairs, deleted nodes are never reached
+    order = [0]
+    depth_of = [0]
+    position = 0
+    while position < len(order):
+        node = order[position]
+        if left[node] != -1:
+            order += [left[node], right[node]]
+            depth_of += [depth_of[position] + 1] * 2
+        position += 1
+    n_nodes = len(order)
+    order = np.asarray(order, dtype=np.intp)
+    new_id = np.full(len(left), -1, dtype=np.intp)
+    new_id[order] = np.arange(n_nodes)
+
+    old_left = np.asarray(left, dtype=np.intp)[order]
+    is_leaf = old_left == -1
+    positions = np.arange(n_nodes, dtype=np.intp)
+    # A leaf's split condition holds its value
+    conditions = np.asarray(tree["split_conditions"], dtype=np.float32)[order]
+    feature = np.where(is_leaf, 0, np.asarray(tree["split_indices"], dtype=np.intp)[order])
+    threshold = np.where(is_leaf, np.float32(np.nan), conditions)
+    new_left = np.where(is_leaf, positions - 1, new_id[np.where(is_leaf, 0, old_left)])
+    default_left = np.asarray(tree["default_left"], dtype=bool)[order] & ~is_leaf
+    value = np.where(is_leaf, conditions, np.float32(0))
+    return feature, threshold, new_left, default_left, value, max(depth_of)
+
+def check_parity(model, ensemble, rows=NUMPY_ENGINE_PARITY_ROWS, seed=0):
+    """Raise ValueError unless ensemble matches model bit for bit on random scaled rows
+
+    Both the raw margins and the predicted classes have to be identical.
+    """
+    rng = np.random.default_rng(seed)
+    # Scaled inputs sit around 0 with unit variance; spread wider to reach rare branches
+    sample = (rng.normal(size=(rows, ensemble.n_features)) * rng.choice([1, 3], size=(rows, 1))).astype(np.float32)
+    expected_margins = np.asarray(model.predict(sample, output_margin=True), dtype=np.float32).reshape(rows, -1)
+    mismatches = int((expected_margins != ensemble.margins(sample)).any(axis=1).sum())
+    if mismatches:
+        raise ValueError(f"NumPy tree evaluator margins differ from the booster's on {mismatches} of {rows} rows")
+
+    expected = np.asarray(model.predict(sample), dtype=np.intp)
+    actual = ensemble.predict(sample)
+    mismatches = int((expected != actual).sum())
+    if mismatches:
+        raise ValueError(f"NumPy tree evaluator disagrees with the booster on {mismatches} of {rows} rows")
+
+class CreditModelEngine:
+    """Scores model input rows with the booster or the flattened evaluator
+
+    The evaluator is only used after it has matched the booster on a parity
+    sample; otherwise, or when it cannot represent the model, every call goes
+    to the booster.
+    """
+
+    def __init__(self, model, engine=CREDIT_INFERENCE_ENGINE, max_batch_size=NUMPY_ENGINE_MAX_BATCH_SIZE):
+        if engine not in ENGINES:
+            raise ValueError(f"CREDIT_INFERENCE_ENGINE must be one of {ENGINES}, got {engine!r}")
+        self.model = model
+        self.engine = engine
+        self.max_batch_size = max_batch_size
+        self.ensemble = None
+        self.fallback_reason = None
+        if engine == "xgboost":
+            return
+
+        try:
+            ensemble = TreeEnsemble.from_model(model)
+            check_parity(model, ensemble)
+        except Exception as e:
+            self.fallback_reason = str(e)
+            logger.warning(f"NumPy tree evaluator disabled, using the booster: {e}")
+            return
+        self.ensemble = ensemble
+
+    def predict(self, X):
+        """Class indices for already encoded and scaled rows"""
+        ensemble = self.ensemble
+        if ensemble is not None and (self.engine == "numpy" or len(X) <= self.max_batch_size):
+            return ensemble.predict(X)
+        return np.asarray(self.model.predict(X), dtype=np.intp)
+
+    def status(self):
+        return {
+            "engine": self.engine,
+            "numpy_enabled": self.ensemble is not None,
+            "numpy_max_batch_size": self.max_batch_size if self.engine == "auto" else None,
+            "fallback_reason": self.fallback_reason,
+        }
@@ -0,0 +1,43 @@
+-- CreateFunction
+-- Publishes every change to "houses" on the "houses_changed" channel so the
+-- ML service recommender can update its in-memory catalog without polling.
+CREATE OR REPLACE FUNCTION "notify_houses_changed"() RETURNS TRIGGER AS $$
+DECLARE
+    changed "houses"%ROWTYPE;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        changed := OLD;
+    ELSE
+        changed := NEW;
+    END IF;
+
+    PERFORM pg_notify(
+        'houses_changed',
+        json_build_object(
+            'op', TG_OP,
+            'row', json_build_object(
+                'id', changed."id",
+                'index', changed."index",
+                'title', changed."title",
+                'price', changed."price",
+                'location', changed."location",
+                'room_count', changed."room_count",
+                'bathroom_count', changed."bathroom_count",
+                'parking_count', changed."parking_count",
+                'land_area', changed."land_area",
+                'building_area', changed."building_area",
+                'image_url', changed."image_url",
+                'is_sold', changed."is_sold",
+                'updated_at', changed."updated_at"
+            )
+        )::text
+    );
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- CreateTrigger
+CREATE TRIGGER "houses_changed_notify"
+AFTER INSERT OR UPDATE OR DELETE ON "houses"
+FOR EACH ROW EXECUTE FUNCTION "notify_houses_changed"();
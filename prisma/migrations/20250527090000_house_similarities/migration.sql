@@ -0,0 +1,8 @@
+-- CreateTable
+CREATE TABLE "house_similarities" (
+    "house_index" INTEGER NOT NULL,
+    "similar_indexes" INTEGER[],
+    "computed_at" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    CONSTRAINT "house_similarities_pkey" PRIMARY KEY ("house_index")
+);
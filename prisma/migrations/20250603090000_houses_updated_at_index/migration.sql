@@ -0,0 +1,2 @@
+-- CreateIndex
+CREATE INDEX "houses_updated_at_index" ON "houses"("updated_at");
@@ -0,0 +1,38 @@
+-- CreateFunction
+-- Publishes only the columns the ML service recommender reads. pg_notify fails
+-- on payloads of 8000 bytes or more, and the trigger runs inside the writing
+-- transaction, so free-text columns such as "title" and "image_url" are left
+-- out: a long value would otherwise fail the insert or update itself.
+CREATE OR REPLACE FUNCTION "notify_houses_changed"() RETURNS TRIGGER AS $$
+DECLARE
+    changed "houses"%ROWTYPE;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        changed := OLD;
+    ELSE
+        changed := NEW;
+    END IF;
+
+    PERFORM pg_notify(
+        'houses_changed',
+        json_build_object(
+            'op', TG_OP,
+            'row', json_build_object(
+                'id', changed."id",
+                'index', changed."index",
+                'price', changed."price",
+                'location', changed."location",
+                'room_count', changed."room_count",
+                'bathroom_count', changed."bathroom_count",
+                'parking_count', changed."parking_count",
+                'land_area', changed."land_area",
+                'building_area', changed."building_area",
+                'is_sold', changed."is_sold",
+                'updated_at', changed."updated_at"
+            )
+        )::text
+    );
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
@@ -43,7 +43,7 @@ export class HousesController {
     }
 
     const payload = {
-      index: house.index,
+      id: house.id,
     };
 
     const fastApiUrl = this.configService.get('FASTAPI_URL');
@@ -34,41 +34,15 @@ export class UserController {
   @Get('profile-risk/predict')
   @HttpCode(HttpStatus.OK)
   async predictProfileRisk(@User('user_id') userId: string) {
-    const user = await this.userService.predictProfileRisk(userId);
-
-    if (!user) {
-      return BaseResponseDto.error('User not found in core banking', null);
-    }
-
-    const payload = {
-      Age: user.age,
-      Occupation: user.occupation || 'Other',
-      Annual_Income: Number(user.annual_income),
-      Monthly_Inhand_Salary: Number(user.monthly_inhand_salary),
-      Num_Bank_Accounts: user.num_bank_accounts,
-      Num_Credit_Card: user.num_credit_cards,
-      Interest_Rate: user.interest_rate,
-      Num_of_Loan: user.num_of_loans,
-      Type_of_Loan: user.type_of_loans,
-      Delay_from_due_date: user.delay_from_due_date,
-      Num_of_Delayed_Payment: user.num_of_delayed_payments,
-      Changed_Credit_Limit: user.changed_credit_limit,
-      Num_Credit_Inquiries: user.num_credit_inquiries,
-      Credit_Mix: user.credit_mix,
-      Outstanding_Debt: user.outstanding_debt,
-      Credit_History_Age: user.credit_history_age,
-      Payment_of_Min_Amount: user.payment_of_minimum_amount,
-      Total_EMI_per_month: Number(user.total_emi_per_month),
-      Payment_Behaviour: user.payment_behaviour,
-      Monthly_Balance: Number(user.monthly_balance),
-    };
+    // The ML service reads the core banking row for this phone number itself
+    const phoneNumber = await this.userService.getPhoneNumber(userId);
 
     try {
       const fastApiUrl = this.configService.get('FASTAPI_URL');
       const response = await firstValueFrom(
         this.httpService.post(
-          `${fastApiUrl}/api/predict/profile-risk`,
-          payload,
+          `${fastApiUrl}/api/predict/profile-risk/by-phone`,
+          { phone_number: phoneNumber },
         ),
       );
 
@@ -89,6 +63,10 @@ export class UserController {
         user,
       );
     } catch (error) {
+      if (error.response?.status === HttpStatus.NOT_FOUND) {
+        return BaseResponseDto.error('User not found in core banking', null);
+      }
+
       console.error('Error calling ML API:', error.message);
       return BaseResponseDto.error(
         'Error calling ML API: ' + error.message,
@@ -7,21 +7,17 @@ import { PrismaService } from '@/prisma/prisma.service';
 export class UserService {
   constructor(private readonly prismaService: PrismaService) {}
 
-  async predictProfileRisk(userId: string) {
+  async getPhoneNumber(userId: string) {
     const user = await this.prismaService.user.findUniqueOrThrow({
       where: {
         id: userId,
       },
+      select: {
+        phone_number: true,
+      },
     });
 
-    const coreBankingProfile =
-      await this.prismaService.coreBankingUser.findFirst({
-        where: {
-          phone_number: user.phone_number,
-        },
-      });
-
-    return coreBankingProfile;
+    return user.phone_number;
   }
 
   async getProfile(userId: string) {